@@ -8,10 +8,26 @@ from flask_moment import Moment
 from flask import Flask
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
+from app.admin import init_app as init_admin
+from app.api_async import bp as api_async_bp, init_app as init_api_async
 from app.auth import init_app as init_auth
+from app.cache import cache
+from app.commands import init_app as init_commands
+from app.db_pool import configure_pool
+from app.db_routing import configure_replicas, replica_router
 from app.errors import init_app as init_errors
+from app.follow_graph import follow_graph
+from app.hashing import hasher
+from app.json_provider import init_app as init_json
+from app.last_seen import last_seen_tracker
 from app.main import init_app as init_main
 from app.models import db
+from app.profiler import profiler
+from app.ratelimit import rate_limiter
+from app.revocation import revocation_list
+from app.search import search_index
+from app.tasks import task_queue
+from app.user_cache import user_cache
 from config import config
 
 
@@ -20,7 +36,24 @@ from config import config
 def create_app(config_name='development'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    # API 响应使用更快的 JSON 编码器
+    init_json(app)
+    # 连接池参数需要在创建引擎之前写入配置
+    configure_pool(app)
+    # 只读副本注册为额外的 bind，读请求的查询轮流发往副本
+    configure_replicas(app)
     db.init_app(app)
+    replica_router.init_app(app)
+    # 初始化 last_seen 写回缓冲
+    last_seen_tracker.init_app(app)
+    # 初始化密码哈希服务
+    hasher.init_app(app)
+    # 全文搜索索引
+    search_index.init_app(app)
+    # 后台任务队列
+    task_queue.init_app(app)
+    # 登录、注册和 API 的请求限流，在其他请求钩子之前检查
+    rate_limiter.init_app(app)
     
     # 初始化登录管理器
     login = LoginManager()
@@ -36,9 +69,17 @@ def create_app(config_name='development'):
     # 注册主蓝图
     init_main(app)
 
+    # 注册管理统计蓝图
+    init_admin(app)
+
+    # 注册命令行命令
+    init_commands(app)
+
     #注册API蓝图
     from app.api_1_0 import api_bp
     app.register_blueprint(api_bp, url_prefix='/api/v1.0')
+    # 异步版本的用户 API，部署方式见 asgi.py
+    init_api_async(app)
 
     # 初始化数据库迁移
     migrate = Migrate(app, db)
@@ -46,13 +87,18 @@ def create_app(config_name='development'):
     moment = Moment(app)
     # 初始化jwt
     jwt = JWTManager(app)
+    # 吊销检查只查进程内的集合，定期从数据库同步
+    revocation_list.init_app(app, jwt)
     # 添加用户加载函数
     # 在每次请求时，Flask-Login 都需要知道当前用户是谁。
     # 为此，它会自动调用通过 @login.user_loader 装饰器注册的用户加载函数。
-    from app.models import User
+    # 认证只用缓存的轻量用户对象，视图需要时才加载完整的 User，见 app/user_cache.py
+    user_cache.init_app(app)
     @login.user_loader
     def load_user(id):
-        return User.query.get(int(id))
+        return user_cache.load(id)
+    # 关注关系缓存，见 app/follow_graph.py
+    follow_graph.init_app(app)
 
     # ####可选方案 - 配置日志文件
 
@@ -69,12 +115,11 @@ def create_app(config_name='development'):
     #     app.logger.setLevel(logging.INFO)
     #     app.logger.info('App startup')
 
-    # ####可选方案 - 缓存支持
+    # 缓存支持：进程内 LRU 或多进程共享的文件系统缓存，见 app/cache.py
+    cache.init_app(app)
 
-    # from flask_caching import Cache
-    #
-    # cache = Cache()
-    # cache.init_app(app, config={'CACHE_TYPE': 'simple'})
+    # SQL 性能分析（默认关闭）
+    profiler.init_app(app)
 
     # ####可选方案 -  CSRF 保护
     # 虽然 Flask-WTF 提供了 CSRF 保护，但如果你使用的是纯 Flask-Form 或其他表单处理方式，建议显式启用 CSRF 保护
@@ -82,11 +127,11 @@ def create_app(config_name='development'):
     from flask_wtf.csrf import CSRFProtect
     csrf = CSRFProtect()
     csrf.init_app(app)
+    # API 使用 JWT 认证，不依赖 cookie 会话，不需要 CSRF 令牌
+    csrf.exempt(api_bp)
+    csrf.exempt(api_async_bp)
 
-    # ####可选方案 -  任务队列支持
-    # from flask_rq2 import RQ
-    # rq = RQ()
-    # rq.init_app(app)
+    # 任务队列使用 app/tasks.py，不依赖 Redis；独立的执行进程用 flask run-worker 启动
     #
     # ####可选方案 -  邮件支持
     # from flask_mail import Mail
@@ -98,8 +143,8 @@ def create_app(config_name='development'):
     @app.before_request
     def before_request():
         if current_user.is_authenticated:
-            current_user.last_seen = datetime.now(UTC)
-            db.session.commit()
+            # 只记入进程内缓冲，由后台线程批量写回，避免每个请求都提交一次事务
+            last_seen_tracker.touch(current_user.id, datetime.now(UTC))
 
 
 
@@ -0,0 +1,8 @@
+from flask import Blueprint
+
+bp = Blueprint('admin', __name__)
+
+from app.admin import routes
+
+def init_app(app):
+    app.register_blueprint(bp, url_prefix='/admin')
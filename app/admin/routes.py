@@ -0,0 +1,40 @@
+from flask import jsonify
+from flask_login import login_required
+
+from app.admin import bp
+from app.decorators import admin_required
+from app.db_pool import pool_status
+from app.db_routing import replica_router
+from app.models import db
+from app.profiler import profiler
+from app.tasks import task_queue
+
+
+@bp.route('/stats/pool')
+@login_required
+@admin_required
+def pool_stats():
+    return jsonify(pool_status(db.engine.pool))
+
+
+@bp.route('/stats/replicas')
+@login_required
+@admin_required
+def replica_stats():
+    return jsonify(replica_router.status())
+
+
+@bp.route('/stats/tasks')
+@login_required
+@admin_required
+def task_stats():
+    return jsonify(task_queue.stats())
+
+
+@bp.route('/profile')
+@login_required
+@admin_required
+def profile_report():
+    if not profiler.enabled:
+        return jsonify({'enabled': False, 'endpoints': []})
+    return jsonify({'enabled': True, 'endpoints': profiler.report()})
@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api_bp = Blueprint('api', __name__)
 
-from app.api_1_0 import users,errors,tokens
\ No newline at end of file
+from app.api_1_0 import users,errors,tokens,bulk,posts
\ No newline at end of file
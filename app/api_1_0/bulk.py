@@ -0,0 +1,201 @@
+"""
+用户批量导入和用户/文章批量导出，请求体和响应体都是 JSON Lines（每行一个 JSON 对象）。
+导入按块处理：每块只做一次批量唯一性查询，密码哈希在哈希进程池中并行计算，再用一条 executemany 插入；
+导出从服务端游标逐批读取并边读边写，不把整张表加载进内存。
+"""
+import json
+from datetime import datetime
+
+from flask import current_app, Response, request, stream_with_context
+from flask_jwt_extended import jwt_required
+from sqlalchemy.exc import IntegrityError
+
+from app.cache import cache
+from app.decorators import admin_required
+from app.hashing import hasher
+from app.models import db, email_digest, Post, User
+from . import api_bp as api
+
+
+def _ndjson(value):
+    return json.dumps(value, ensure_ascii=False, default=_default) + '\n'
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def _chunks(lines, size):
+    chunk = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        chunk.append((number, line))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _import_chunk(chunk, seen_usernames, seen_emails):
+    """
+    导入一块数据
+    :param chunk: [(行号, 原始行)]
+    :param seen_usernames: 本次导入已经出现过的用户名
+    :param seen_emails: 本次导入已经出现过的邮箱
+    :return: 按行号排列的结果列表
+    """
+    results = {}
+    candidates = []
+    for number, line in chunk:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            results[number] = {'line': number, 'status': 'error', 'message': 'invalid JSON'}
+            continue
+        if not isinstance(data, dict) or not all(
+                isinstance(data.get(f), str) and data.get(f) for f in ('username', 'email', 'password')):
+            results[number] = {'line': number, 'status': 'error',
+                               'message': 'must include username, email and password fields'}
+            continue
+        if data['username'] in seen_usernames:
+            results[number] = {'line': number, 'status': 'error', 'username': data['username'],
+                               'message': 'please use a different username'}
+            continue
+        if data['email'] in seen_emails:
+            results[number] = {'line': number, 'status': 'error', 'username': data['username'],
+                               'message': 'please use a different email address'}
+            continue
+        seen_usernames.add(data['username'])
+        seen_emails.add(data['email'])
+        candidates.append((number, data))
+
+    if candidates:
+        # 一次查询检查整块的用户名和邮箱是否已被占用
+        taken = db.session.query(User.username, User.email).filter(db.or_(
+            User.username.in_([d['username'] for _, d in candidates]),
+            User.email.in_([d['email'] for _, d in candidates]))).all()
+        taken_usernames = {row.username for row in taken}
+        taken_emails = {row.email for row in taken}
+        accepted = []
+        for number, data in candidates:
+            if data['username'] in taken_usernames:
+                message = 'please use a different username'
+            elif data['email'] in taken_emails:
+                message = 'please use a different email address'
+            else:
+                accepted.append((number, data))
+                continue
+            results[number] = {'line': number, 'status': 'error', 'username': data['username'],
+                               'message': message}
+
+        # 在哈希进程池中并行计算，队列满时等待
+        hashes = hasher.hash_many([d['password'] for _, d in accepted])
+        now = datetime.utcnow()
+        rows = [{
+            'username': data['username'],
+            'email': data['email'],
+            'email_hash': email_digest(data['email']),
+            'about_me': data.get('about_me'),
+            'password_hash': password_hash,
+            'last_seen': now,
+            'updated_at': now,
+        } for (_, data), password_hash in zip(accepted, hashes)]
+        conflicts = _insert_users(rows) if rows else {}
+        for i, (number, data) in enumerate(accepted):
+            if i in conflicts:
+                results[number] = {'line': number, 'status': 'error',
+                                   'username': data['username'], 'message': conflicts[i]}
+            else:
+                results[number] = {'line': number, 'status': 'created',
+                                   'username': data['username']}
+    return [results[number] for number in sorted(results)]
+
+
+def _insert_users(rows):
+    """
+    插入一块用户。检查之后仍可能违反唯一约束（并发注册、不区分大小写的排序规则等），
+    这时回滚整块，改为逐行插入，只跳过冲突的行
+    :param rows: 要插入的行
+    :return: {冲突行的下标: 提示信息}
+    """
+    try:
+        db.session.execute(db.insert(User), rows)
+        cache.invalidate_on_commit(db.session, 'users')
+        db.session.commit()
+        return {}
+    except IntegrityError:
+        db.session.rollback()
+    conflicts = {}
+    for i, row in enumerate(rows):
+        try:
+            db.session.execute(db.insert(User), [row])
+            cache.invalidate_on_commit(db.session, 'users')
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            conflicts[i] = _conflict_message(row)
+    return conflicts
+
+
+def _conflict_message(row):
+    # 按数据库的比较规则查出冲突的字段，与逐块检查时一样用户名优先
+    if db.session.query(User.id).filter(User.username == row['username']).first():
+        return 'please use a different username'
+    if db.session.query(User.id).filter(User.email == row['email']).first():
+        return 'please use a different email address'
+    return 'username or email address is already in use'
+
+
+@api.route('/users/import', methods=['POST'])
+@jwt_required()
+@admin_required
+def import_users():
+    """
+    批量导入用户。请求体每行一个 {"username", "email", "password", "about_me"} 对象，
+    响应每行对应一条输入的结果
+    """
+    size = current_app.config.get('BULK_IMPORT_CHUNK_SIZE', 500)
+    stream = request.stream
+
+    def generate():
+        seen_usernames, seen_emails = set(), set()
+        lines = (raw.decode('utf-8', 'replace') for raw in stream)
+        for chunk in _chunks(lines, size):
+            for result in _import_chunk(chunk, seen_usernames, seen_emails):
+                yield _ndjson(result)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def _export(columns):
+    size = current_app.config.get('BULK_EXPORT_BATCH_SIZE', 1000)
+    names = [column.key for column in columns]
+
+    def generate():
+        # yield_per 使用服务端游标，每次只从数据库取一批
+        result = db.session.execute(
+            db.select(*columns).order_by(columns[0]).execution_options(yield_per=size))
+        for row in result:
+            yield _ndjson(dict(zip(names, row)))
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@api.route('/users/export', methods=['GET'])
+@jwt_required()
+@admin_required
+def export_users():
+    return _export([User.id, User.username, User.email, User.about_me, User.last_seen,
+                    User.post_count, User.follower_count, User.followed_count])
+
+
+@api.route('/posts/export', methods=['GET'])
+@jwt_required()
+@admin_required
+def export_posts():
+    return _export([Post.id, Post.user_id, Post.timestamp, Post.body])
@@ -0,0 +1,53 @@
+"""
+条件请求（If-None-Match / If-Modified-Since）支持。
+校验值只用一条只取版本列的轻量查询算出，命中时直接返回 304，不再执行 to_dict 和 JSON 编码。
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, request
+
+
+def make_etag(rows):
+    """
+    由 (id, version, ...) 行集合生成弱 ETag 的值
+    :param rows: 轻量查询的结果行
+    """
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(repr(tuple(row)).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def conditional(validators):
+    """
+    给 GET 视图加上 ETag 和 Last-Modified。
+    :param validators: 接收视图参数的函数，返回 (etag, last_modified)，last_modified 为 None 时只发 ETag；
+                       返回 None 时跳过条件处理
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            result = validators(**kwargs)
+            if result is None:
+                return f(*args, **kwargs)
+            etag, last_modified = result
+            probe = current_app.response_class()
+            _set_validators(probe, etag, last_modified)
+            probe.make_conditional(request)
+            if probe.status_code == 304:
+                return probe
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified)
+            return response
+        return decorated
+    return decorator
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    # 给 last_modified 赋 None 时 werkzeug 会写入当前时间，所以为 None 时不设置
+    if last_modified is not None:
+        response.last_modified = last_modified
@@ -0,0 +1,144 @@
+from flask import abort, current_app, jsonify, request, url_for
+from flask_jwt_extended import get_jwt_identity, jwt_required
+
+from app.cache import cache
+from app.json_provider import collection_response
+from app.models import db, Post, User
+from app.search import search_index
+from . import api_bp as api
+from .errors import bad_request
+
+# ?fields= 可选的字段及对应的列，字段名与 Post.to_dict 一致
+_FIELDS = {
+    'id': Post.id,
+    'body': Post.body,
+    'timestamp': Post.timestamp,
+    'author_id': Post.user_id.label('author_id'),
+}
+# 游标分页的排序键，稀疏字段集没有选中时也要查询出来
+_KEYS = (Post.timestamp, Post.id)
+
+
+def _requested_fields():
+    """
+    解析 ?fields=id,timestamp
+    :return: 字段名列表，没有 fields 参数时返回 None
+    :raises ValueError: 有未知字段
+    """
+    if 'fields' not in request.args:
+        return None
+    fields = [f for f in request.args['fields'].split(',') if f]
+    if not fields:
+        raise ValueError('fields must not be empty')
+    unknown = [f for f in fields if f not in _FIELDS]
+    if unknown:
+        raise ValueError('unknown field(s): {}'.format(','.join(unknown)))
+    return list(dict.fromkeys(fields))
+
+
+def _row_serializer(fields, columnar):
+    """
+    只查询部分列时的序列化函数，结果行直接转换，不构造 ORM 对象
+    :param columnar: True 时返回 {字段: [值, ...]}，否则返回 [{字段: 值}, ...]
+    """
+    def serialize(rows):
+        if columnar:
+            return {field: [getattr(row, field) for row in rows] for field in fields}
+        return [{field: getattr(row, field) for field in fields} for row in rows]
+    return serialize
+
+
+def _post_collection(query, endpoint, **kwargs):
+    """
+    文章集合的公共处理：稀疏字段集、列式输出以及游标/页码两种分页
+    :param query: 未排序的文章查询
+    """
+    try:
+        fields = _requested_fields()
+    except ValueError as e:
+        return bad_request(str(e))
+    columnar = request.args.get('format') == 'columns'
+    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    serialize = None
+    if fields is not None or columnar:
+        fields = fields or list(_FIELDS)
+        # 只 SELECT 需要的列，排序键一并取出供游标使用
+        columns = [_FIELDS[f] for f in fields]
+        columns += [key for key in _KEYS if key.key not in fields]
+        query = query.with_entities(*columns)
+        serialize = _row_serializer(fields, columnar)
+        kwargs['fields'] = ','.join(fields)
+        if columnar:
+            kwargs['format'] = 'columns'
+    if 'cursor' in request.args:
+        try:
+            data = Post.to_cursor_dict(query, _KEYS, request.args['cursor'], per_page, endpoint,
+                                       serialize=serialize, **kwargs)
+        except ValueError:
+            return bad_request('invalid cursor')
+        return collection_response(data)
+    page = request.args.get('page', 1, type=int)
+    data = Post.to_collection_dict(query.order_by(Post.timestamp.desc(), Post.id.desc()), page,
+                                   per_page, endpoint, count='cached', serialize=serialize,
+                                   **kwargs)
+    return collection_response(data)
+
+
+@api.route('/posts', methods=['GET'])
+@cache.cached('posts')
+def get_posts():
+    """
+    所有文章，按时间倒序。支持 ?fields=id,timestamp,author_id 只返回部分字段，
+    ?format=columns 按列返回数组，?cursor= 游标分页
+    """
+    return _post_collection(Post.query, 'api.get_posts')
+
+
+@api.route('/users/<int:id>/posts', methods=['GET'])
+@cache.cached('posts')
+def get_user_posts(id):
+    if db.session.query(User.id).filter(User.id == id).first() is None:
+        abort(404)
+    return _post_collection(Post.query.filter(Post.user_id == id), 'api.get_user_posts', id=id)
+
+
+@api.route('/posts/<int:id>', methods=['GET'])
+def get_post(id):
+    return jsonify(Post.query.get_or_404(id).to_dict())
+
+
+@api.route('/posts', methods=['POST'])
+@jwt_required()
+def create_post():
+    data = request.get_json() or {}
+    body = data.get('body')
+    if not isinstance(body, str) or not body.strip():
+        return bad_request('must include a body field')
+    user = db.session.get(User, int(get_jwt_identity()))
+    if user is None:
+        return bad_request('user no longer exists')
+    post = user.add_post(body)
+    db.session.commit()
+    response = jsonify(post.to_dict())
+    response.status_code = 201
+    response.headers['Location'] = url_for('api.get_post', id=post.id)
+    return response
+
+
+@api.route('/posts/search', methods=['GET'])
+def search_posts():
+    """
+    全文搜索文章，按相关度排序，用 next 链接中的游标翻页
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return bad_request('must include a q parameter')
+    per_page = min(request.args.get('per_page', current_app.config['SEARCH_RESULTS_PER_PAGE'],
+                                    type=int), 100)
+    cursor = request.args.get('cursor')
+    try:
+        posts, next_cursor = search_index.search_posts(q, cursor, per_page)
+    except ValueError:
+        return bad_request('invalid cursor')
+    return jsonify(Post.cursor_dict(posts, cursor, next_cursor, None, per_page,
+                                    'api.search_posts', q=q))
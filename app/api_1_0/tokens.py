@@ -1,11 +1,87 @@
-from flask import jsonify, request, current_app
-from flask_jwt_extended import jwt_required, create_access_token,get_jwt_identity
+from flask import jsonify, request
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token, \
+    get_jwt, get_jwt_identity, jwt_required
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
 
+from app.models import db, User
+from app.revocation import revocation_list
+from . import api_bp as api
+from .errors import bad_request
 
+
+def token_claims(user):
+    """
+    写进访问令牌的常用字段，只需要身份信息的接口可以直接从令牌读取，不查数据库。
+    ver 是签发时的用户版本号，用户资料或计数变化后令牌里的值不会更新
+    """
+    return {'username': user.username, 'ver': user.version}
+
+
+def issue_tokens(user):
+    """
+    为用户签发访问令牌和刷新令牌
+    :return: JSON 响应
+    """
+    identity = str(user.id)
+    return jsonify(access_token=create_access_token(identity=identity,
+                                                    additional_claims=token_claims(user)),
+                   refresh_token=create_refresh_token(identity=identity))
+
+
+def authenticate(data):
+    """
+    校验用户名和密码
+    :return: 校验通过的用户，否则返回 None
+    """
+    user = User.query.filter_by(username=data.get('username')).first()
+    if user is None or not user.check_password(data.get('password')):
+        return None
+    # check_password 可能用新参数重新计算了哈希
+    if db.session.is_modified(user):
+        db.session.commit()
+    return user
+
+
+@api.route('/tokens', methods=['POST'])
 def get_tokens():
+    user = authenticate(request.get_json() or {})
+    if user is None:
+        return bad_request('invalid username or password')
+    return issue_tokens(user)
 
-    pass
 
-def revoke_token(token):
-    pass
+@api.route('/tokens/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    # 刷新时重新读取用户，让新令牌里的 username 和 ver 是最新的
+    user = db.session.get(User, int(get_jwt_identity()))
+    if user is None:
+        return bad_request('user no longer exists')
+    return jsonify(access_token=create_access_token(identity=str(user.id),
+                                                    additional_claims=token_claims(user)))
+
 
+@api.route('/tokens', methods=['DELETE'])
+@jwt_required()
+def revoke_tokens():
+    """吊销当前访问令牌，请求体中带 refresh_token 时一并吊销"""
+    refresh = (request.get_json(silent=True) or {}).get('refresh_token')
+    if refresh:
+        try:
+            payload = decode_token(refresh)
+        except (PyJWTError, JWTExtendedException):
+            return bad_request('invalid refresh token')
+        if payload.get('type') != 'refresh' or payload['sub'] != get_jwt_identity():
+            return bad_request('invalid refresh token')
+        revoke_token(payload)
+    revoke_token(get_jwt())
+    return '', 204
+
+
+def revoke_token(token):
+    """
+    吊销令牌
+    :param token: 解码后的 JWT 载荷
+    """
+    revocation_list.revoke(token)
@@ -1,34 +1,93 @@
-from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 
 from . import api_bp as api
 from flask import jsonify, request, url_for
+from app.cache import cache
+from app.json_provider import collection_response
 from app.models import User, db
+from app.pagination import keyset_page
+from .conditional import conditional, make_etag
 from .errors import bad_request
+from .tokens import authenticate, issue_tokens
 
 @api.route('/users/login', methods=['POST'])
 def login():
-    data = request.get_json() or {}
-    username = data.get('username')
-    password = data.get('password')
-    user = User.query.filter_by(username=username).first()
-    if user and user.check_password(password):
-        access_token = create_access_token(identity=user.id)
-        return jsonify(access_token=access_token)
-    return bad_request('invalid username or password')
+    user = authenticate(request.get_json() or {})
+    if user is None:
+        return bad_request('invalid username or password')
+    return issue_tokens(user)
+
+
+@api.route('/users/me', methods=['GET'])
+@jwt_required()
+def get_me():
+    # 只用令牌中的字段作答，不访问数据库；需要完整资料时请求 self 链接
+    claims = get_jwt()
+    user_id = int(claims['sub'])
+    return jsonify({
+        'id': user_id,
+        'username': claims.get('username'),
+        'version': claims.get('ver'),
+        '_links': {'self': url_for('api.get_user', id=user_id)},
+    })
+
+# 生成 ETag 用的轻量列：版本号覆盖资料和计数的变化，last_seen 由写回缓冲单独更新。
+# 响应体含 last_seen，而 updated_at 不随 last_seen 变化，所以只发 ETag，不发 Last-Modified
+_VALIDATOR_COLUMNS = (User.id, User.version, User.updated_at, User.last_seen)
+
+
+def _user_validators(id):
+    if int(get_jwt_identity()) != id:
+        return None
+    row = db.session.query(*_VALIDATOR_COLUMNS).filter(User.id == id).first()
+    if row is None:
+        return None
+    return make_etag([row]), None
+
+
+def _users_validators():
+    per_page = min(request.args.get('per_page', 10, type=int),100)
+    query = User.query.with_entities(*_VALIDATOR_COLUMNS)
+    if 'cursor' in request.args:
+        try:
+            rows = keyset_page(query, (User.id,), request.args['cursor'], per_page,
+                               descending=False)[0]
+        except ValueError:
+            return None
+    else:
+        page = request.args.get('page', 1, type=int)
+        rows = query.order_by(User.id).limit(per_page).offset((page - 1) * per_page).all()
+        # 页码模式的响应里有总数，新增用户也要让 ETag 变化
+        rows.append(('total', User._cached_count(User.query.order_by(User.id))))
+    return make_etag(rows), None
+
+
 @api.route('/users/<int:id>',methods=['GET'])
 @jwt_required()
+@conditional(_user_validators)
 def get_user(id):
-    user_id = get_jwt_identity()
-    if user_id != id:
+    if int(get_jwt_identity()) != id:
         return bad_request('you can only access your own information')
     return jsonify(User.query.get_or_404(id).to_dict())
 
 @api.route('/users',methods=['GET'])
+@conditional(_users_validators)
+@cache.cached('users')
 def get_users():
-    page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 10, type=int),100)
-    data = User.to_collection_dict(User.query, page, per_page, 'api.get_users')
-    return jsonify(data)
+    if 'cursor' in request.args:
+        # 游标分页：按 id 定位，不受翻页深度影响
+        try:
+            data = User.to_cursor_dict(User.query, (User.id,), request.args['cursor'],
+                                       per_page, 'api.get_users', descending=False)
+        except ValueError:
+            return bad_request('invalid cursor')
+        return collection_response(data)
+    page = request.args.get('page', 1, type=int)
+    # 总数在短时间内复用，避免每次翻页都执行一次 COUNT
+    data = User.to_collection_dict(User.query.order_by(User.id), page, per_page, 'api.get_users',
+                                   count='cached')
+    return collection_response(data)
 
 @api.route('/users',methods=['POST'])
 def create_user():
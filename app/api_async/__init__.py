@@ -0,0 +1,15 @@
+"""
+异步版本的用户 API，挂在 /api/async/v1.0 下，接口和响应格式与 /api/v1.0 的对应接口一致。
+部署方式见 asgi.py
+"""
+from flask import Blueprint
+
+from app.async_db import async_db
+
+bp = Blueprint('api_async', __name__)
+
+from app.api_async import users
+
+def init_app(app):
+    async_db.init_app(app)
+    app.register_blueprint(bp, url_prefix='/api/async/v1.0')
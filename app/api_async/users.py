@@ -0,0 +1,109 @@
+import asyncio
+
+from flask import abort, jsonify, request, url_for
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from sqlalchemy import func, select
+
+from app.api_1_0.conditional import make_etag
+from app.api_1_0.errors import bad_request
+from app.api_1_0.tokens import issue_tokens
+from app.async_db import async_db
+from app.cache import cache
+from app.hashing import hasher
+from app.models import User
+from app.pagination import keyset_query, keyset_result
+from app.api_async import bp as api
+
+
+@api.route('/users/login', methods=['POST'])
+async def login():
+    data = request.get_json() or {}
+    async with async_db.session() as session:
+        user = (await session.execute(
+            select(User).filter_by(username=data.get('username')))).scalars().first()
+        if user is None or not await hasher.verify_async(user.password_hash, data.get('password')):
+            return bad_request('invalid username or password')
+        if hasher.needs_rehash(user.password_hash):
+            user.password_hash = await hasher.hash_async(data.get('password'))
+            user.forget_session_cache(session.sync_session)
+            await session.commit()
+    return issue_tokens(user)
+
+
+@api.route('/users/<int:id>', methods=['GET'])
+@jwt_required()
+async def get_user(id):
+    if int(get_jwt_identity()) != id:
+        return bad_request('you can only access your own information')
+    async with async_db.session() as session:
+        user = await session.get(User, id)
+    if user is None:
+        abort(404)
+    response = jsonify(user.to_dict())
+    response.set_etag(make_etag([(user.id, user.version, user.updated_at, user.last_seen)]),
+                      weak=True)
+    # 响应体含 last_seen，updated_at 不能作为 Last-Modified，只用 ETag
+    return response.make_conditional(request)
+
+
+@api.route('/users', methods=['GET'])
+@cache.cached('users')
+async def get_users():
+    per_page = min(request.args.get('per_page', 10, type=int), 100)
+    if 'cursor' in request.args:
+        try:
+            query, state = keyset_query(select(User), (User.id,), request.args['cursor'],
+                                        per_page, descending=False)
+        except ValueError:
+            return bad_request('invalid cursor')
+        async with async_db.session() as session:
+            rows = (await session.execute(query)).scalars().all()
+        items, next_cursor, prev_cursor = keyset_result(rows, (User.id,), per_page, state)
+        return jsonify(User.cursor_dict(items, request.args['cursor'], next_cursor, prev_cursor,
+                                        per_page, 'api_async.get_users'))
+    page = max(request.args.get('page', 1, type=int), 1)
+    # 本页数据和总数用两个连接并发查询
+    items, total = await asyncio.gather(_users_page(page, per_page), _users_total())
+    pages = -(-total // per_page) if total else 0
+    return jsonify(User.collection_dict(items, page, per_page, total, pages, page < pages,
+                                        'api_async.get_users'))
+
+
+async def _users_page(page, per_page):
+    async with async_db.session() as session:
+        result = await session.execute(
+            select(User).order_by(User.id).limit(per_page).offset((page - 1) * per_page))
+        return result.scalars().all()
+
+
+async def _users_total():
+    async with async_db.session() as session:
+        return await session.scalar(select(func.count()).select_from(User))
+
+
+@api.route('/users', methods=['POST'])
+async def create_user():
+    data = request.get_json() or {}
+    if 'username' not in data or 'email' not in data or 'password' not in data:
+        return bad_request('must include username, email and password fields')
+    async with async_db.session() as session:
+        taken = (await session.execute(select(User.username, User.email).filter(
+            (User.username == data['username']) | (User.email == data['email'])))).all()
+        if any(row.username == data['username'] for row in taken):
+            return bad_request('please use a different username')
+        if taken:
+            return bad_request('please use a different email address')
+        user = User()
+        for field in ['username', 'email', 'about_me']:
+            if field in data:
+                setattr(user, field, data[field])
+        user.password_hash = await hasher.hash_async(data['password'])
+        user.touch()
+        session.add(user)
+        # 缓存失效挂在异步会话内部的同步会话上，提交后由同一个监听器处理
+        cache.invalidate_on_commit(session.sync_session, 'users')
+        await session.commit()
+    response = jsonify(user.to_dict())
+    response.status_code = 201
+    response.headers['Location'] = url_for('api_async.get_user', id=user.id)
+    return response
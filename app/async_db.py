@@ -0,0 +1,82 @@
+"""
+异步 API 使用的 SQLAlchemy 异步引擎。
+模型定义与同步代码共用（User、Post 等），只是通过 AsyncSession 执行查询，等待数据库时不占用线程。
+
+异步引擎的连接绑定在创建它的事件循环上，因此按事件循环分别创建引擎：
+- 由 asgi.py 启动时，所有异步视图都运行在 ASGI 服务器的同一个事件循环上，共用一个带连接池的引擎；
+- 由 run.py 等 WSGI 服务器启动时，Flask 为每个异步视图新建一个事件循环，
+  这时使用不带连接池的引擎，连接在会话结束时关闭，不会遗留在已关闭的事件循环上。
+"""
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from config import async_uri
+
+
+class AsyncDatabase(object):
+    """
+    配置项：
+    ASYNC_DATABASE_URI: 异步连接串，为空时由 SQLALCHEMY_DATABASE_URI 换成 ASYNC_DB_DRIVER 得到
+    ASYNC_DB_POOL_SIZE / ASYNC_DB_MAX_OVERFLOW: 共享事件循环时连接池的大小
+    """
+
+    def __init__(self, app=None):
+        self.uri = None
+        self.engine_options = {}
+        self.shared_loop = False
+        self._engines = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.uri = app.config.get('ASYNC_DATABASE_URI') or async_uri(
+            app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('ASYNC_DB_DRIVER', 'aiomysql'))
+        self.engine_options = {'pool_pre_ping': app.config.get('DB_POOL_PRE_PING', True)}
+        if not self.uri.startswith('sqlite'):
+            self.engine_options.update(
+                pool_size=app.config.get('ASYNC_DB_POOL_SIZE', 10),
+                max_overflow=app.config.get('ASYNC_DB_MAX_OVERFLOW', 20),
+                pool_recycle=app.config.get('DB_POOL_RECYCLE', 3600))
+        app.extensions['async_db'] = self
+
+    def use_shared_loop(self):
+        """由 ASGI 入口调用：之后创建的引擎都带连接池，供同一个事件循环上的所有请求共用"""
+        self.shared_loop = True
+
+    @property
+    def engine(self):
+        """当前事件循环的异步引擎"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            engine = self._engines.get(loop)
+            if engine is None:
+                if self.shared_loop:
+                    engine = create_async_engine(self.uri, **self.engine_options)
+                else:
+                    engine = create_async_engine(self.uri, poolclass=NullPool)
+                self._engines[loop] = engine
+        return engine
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        打开一个异步会话，提交后的对象不过期，可以在会话关闭后继续序列化
+        """
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            yield session
+
+    async def dispose(self):
+        """关闭当前事件循环的连接池"""
+        with self._lock:
+            engine = self._engines.pop(asyncio.get_running_loop(), None)
+        if engine is not None:
+            await engine.dispose()
+
+
+async_db = AsyncDatabase()
@@ -1,10 +1,16 @@
 from datetime import datetime, UTC
-from flask import render_template, flash, redirect, url_for, request, current_app
+from flask import render_template, stream_template, flash, redirect, url_for, request, current_app, abort
 from flask_login import current_user, login_user, logout_user, login_required
 from werkzeug.urls import url_parse
 
+from markupsafe import Markup
+from sqlalchemy.orm.attributes import set_committed_value
+
 from app.auth.forms import LoginForm, RegistrationForm, EditUserForm, PostForm
+from app.cache import cache
 from app.models import User, db, Post
+from app.pagination import KeysetPage, keyset_page
+from app.search import search_index
 from flask import Blueprint
 
 from config import Config
@@ -17,17 +23,74 @@ auth = Blueprint('auth', __name__)
 def index():
     form = PostForm()
     if form.validate_on_submit():
-        post = Post(body=form.body.data,user_id=current_user.id)
-        db.session.add(post)
+        current_user.add_post(form.body.data)
         db.session.commit()
         flash('文章提交成功！')
         return redirect(url_for('auth.index'))
+    # 文章列表与登录用户无关，按分页参数缓存渲染好的片段；表单含 CSRF 令牌，不进缓存
+    posts_html = cache.get_or_set(cache.make_key('posts', 'users'), _render_home_posts)
+    return render_template('index.html', title='Home', form=form, posts_html=Markup(posts_html))
+
+
+def _render_home_posts():
     # posts = Post.query.order_by(Post.timestamp.desc()).all()
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.timestamp.desc()).paginate(page = page, per_page = current_app.config['POSTS_PER_PAGE'], error_out = False)
-    next_url = url_for('auth.index',page = posts.next_num) if posts.has_next else None
-    prev_url = url_for('auth.index',page = posts.prev_num) if posts.has_prev else None
-    return render_template('index.html', title='Home', posts=posts.items,form=form,next_url=next_url,prev_url=prev_url)
+    per_page = current_app.config['POSTS_PER_PAGE']
+    if 'page' in request.args:
+        # 兼容旧的页码分页链接
+        page = request.args.get('page', 1, type=int)
+        posts = Post.query.order_by(Post.timestamp.desc()).paginate(page = page, per_page = per_page, error_out = False)
+        next_url = url_for('auth.index',page = posts.next_num) if posts.has_next else None
+        prev_url = url_for('auth.index',page = posts.prev_num) if posts.has_prev else None
+        posts = posts.items
+    else:
+        # 按 (timestamp, id) 游标分页，走 ix_post_timestamp 索引定位
+        try:
+            posts, next_cursor, prev_cursor = keyset_page(
+                Post.query, (Post.timestamp, Post.id), request.args.get('cursor'), per_page)
+        except ValueError:
+            abort(400)
+        next_url = url_for('auth.index', cursor=next_cursor) if next_cursor else None
+        prev_url = url_for('auth.index', cursor=prev_cursor) if prev_cursor else None
+    Post.load_authors(posts)
+    return render_template('_post_list.html', posts=posts,next_url=next_url,prev_url=prev_url)
+
+
+@auth.route("/timeline")
+@login_required
+def timeline():
+    form = PostForm()
+    posts_html = cache.get_or_set(cache.make_key('posts', 'users', vary_on_user=True),
+                                  _render_timeline_posts)
+    return render_template('index.html', title='Timeline', form=form, posts_html=Markup(posts_html))
+
+
+def _render_timeline_posts():
+    query, keys, key_func = current_user.timeline()
+    try:
+        posts, next_cursor, prev_cursor = keyset_page(
+            query, keys, request.args.get('cursor'), current_app.config['POSTS_PER_PAGE'],
+            key_func=key_func)
+    except ValueError:
+        abort(400)
+    next_url = url_for('auth.timeline', cursor=next_cursor) if next_cursor else None
+    prev_url = url_for('auth.timeline', cursor=prev_cursor) if prev_cursor else None
+    Post.load_authors(posts)
+    return render_template('_post_list.html', posts=posts,next_url=next_url,prev_url=prev_url)
+
+
+@auth.route("/search")
+@login_required
+def search():
+    q = request.args.get('q', '').strip()
+    posts, next_url = [], None
+    if q:
+        try:
+            posts, next_cursor = search_index.search_posts(
+                q, request.args.get('cursor'), current_app.config['SEARCH_RESULTS_PER_PAGE'])
+        except ValueError:
+            abort(400)
+        next_url = url_for('auth.search', q=q, cursor=next_cursor) if next_cursor else None
+    return render_template('search.html', title='Search', q=q, posts=posts, next_url=next_url)
 
 
 @auth.route("/login", methods=["GET", "POST"])
@@ -40,6 +103,9 @@ def login():
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password')
             return redirect(url_for('auth.login'))
+        # check_password 可能用新参数重新计算了哈希
+        if db.session.is_modified(user):
+            db.session.commit()
         login_user(user, remember=form.remember_me.data)
         next_page = request.args.get('next')
         if not next_page or url_parse(next_page).netloc != '':
@@ -70,9 +136,20 @@ def register():
 
 @auth.route("/user/<username>")
 @login_required
+@cache.cached('users', 'posts', vary_on_user=True)
 def user(username):
     user = User.query.filter_by(username=username).first_or_404()
-    posts = user.posts.order_by(Post.timestamp.desc()).all()
+    # 按 (timestamp, id) 游标分页，走 (user_id, timestamp) 索引，只取一页
+    try:
+        posts = KeysetPage(user.posts, (Post.timestamp, Post.id), request.args.get('cursor'),
+                           current_app.config['PROFILE_POSTS_PER_PAGE'],
+                           on_item=lambda post: set_committed_value(post, 'author', user))
+    except ValueError:
+        abort(400)
+    if current_app.config['PROFILE_STREAM']:
+        # 先发送页头，文章在模板遍历时才查询并逐篇发送
+        return current_app.response_class(
+            stream_template('user.html', user=user, posts=posts))
     return render_template('user.html', user=user, posts=posts)
 
 @auth.route("/edit_pwd", methods=["GET", "POST"])
@@ -0,0 +1,295 @@
+"""
+页面和 API 响应缓存。
+提供进程内 LRU 和文件系统两种后端，文件系统后端可以被同一台机器上的多个 worker 进程共享，
+都不依赖外部缓存服务。
+缓存键包含命名空间的版本号，失效时只需给命名空间换一个新版本号，旧条目自然过期。
+"""
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, has_request_context, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class LRUBackend(object):
+    """进程内 LRU 缓存，超过 max_entries 时淘汰最久未使用的条目"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileSystemBackend(object):
+    """
+    文件系统缓存，每个条目一个文件，写入时先写临时文件再原子替换，
+    多个 worker 进程可以安全地共享同一个目录
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._file(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def _prune(self):
+        # 条目过多时按修改时间删除最旧的一半
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        if len(names) <= self.max_entries:
+            return
+        files = []
+        for name in names:
+            full = os.path.join(self.path, name)
+            try:
+                files.append((os.path.getmtime(full), full))
+            except OSError:
+                pass
+        files.sort()
+        for _, full in files[:len(files) // 2]:
+            try:
+                os.remove(full)
+            except OSError:
+                pass
+
+
+class Cache(object):
+    """
+    缓存扩展。配置项：
+    CACHE_TYPE: 'lru'、'filesystem' 或 'null'（关闭缓存）
+    CACHE_DIR: 文件系统后端的目录
+    CACHE_MAX_ENTRIES: 最多缓存的条目数
+    CACHE_DEFAULT_TTL: 默认过期秒数
+    CACHE_TTLS: 按端点（endpoint）单独指定的过期秒数
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'lru')
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 1024)
+        if cache_type == 'filesystem':
+            self.backend = FileSystemBackend(app.config['CACHE_DIR'], max_entries)
+        elif cache_type == 'lru':
+            self.backend = LRUBackend(max_entries)
+        else:
+            self.backend = None
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        if self.backend is not None:
+            self.backend.set(key, value, ttl if ttl is not None else self.ttl())
+
+    def get_or_set(self, key, func, ttl=None):
+        """
+        读取缓存，未命中时调用 func 生成并写入
+        :param key: make_key 生成的键
+        :param func: 无参函数，返回要缓存的值
+        """
+        value = self.get(key)
+        if value is None:
+            value = func()
+            self.set(key, value, ttl)
+        return value
+
+    def ttl(self, endpoint=None):
+        """
+        取端点的过期时间
+        :param endpoint: 端点名，默认当前请求的端点
+        """
+        if endpoint is None and has_request_context():
+            endpoint = request.endpoint
+        ttls = current_app.config.get('CACHE_TTLS', {})
+        return ttls.get(endpoint, current_app.config.get('CACHE_DEFAULT_TTL', 60))
+
+    def _version(self, namespace):
+        if self.backend is None:
+            return ''
+        key = 'ns:' + namespace
+        version = self.backend.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            self.backend.set(key, version)
+        return version
+
+    def make_key(self, *namespaces, vary_on_user=False):
+        """
+        生成当前请求的缓存键：命名空间版本号 + 端点 + 视图参数 + 查询参数（含分页参数），
+        vary_on_user 为 True 时再加上当前登录用户
+        """
+        parts = [self._version(ns) for ns in namespaces]
+        parts.append(request.endpoint or '')
+        parts.append(repr(sorted((request.view_args or {}).items())))
+        parts.append(repr(sorted(request.args.items(multi=True))))
+        if vary_on_user:
+            parts.append(str(current_user.get_id()) if current_user.is_authenticated else '-')
+        return 'view:' + hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def invalidate(self, *namespaces):
+        """立即让命名空间下的所有缓存失效"""
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            self.backend.set('ns:' + namespace, uuid.uuid4().hex)
+
+    def invalidate_on_commit(self, db_session, *namespaces):
+        """
+        在数据库事务提交后再让命名空间失效，避免提交前被其他请求用旧数据重新填充
+        :param db_session: 当前数据库会话
+        """
+        db_session.info.setdefault('cache_invalidate', set()).update(namespaces)
+
+    def cached(self, *namespaces, vary_on_user=False):
+        """
+        缓存 GET 视图的响应。只缓存非流式的 200 响应；有待显示的 flash 消息时不读也不写缓存。
+        异步视图得到异步的包装函数，在事件循环上直接 await 视图
+        :param namespaces: 响应依赖的数据命名空间，任一失效都会使缓存失效
+        :param vary_on_user: 响应内容是否随登录用户变化
+        """
+        def decorator(f):
+            if inspect.iscoroutinefunction(f):
+                @wraps(f)
+                async def decorated_async(*args, **kwargs):
+                    key, response = self._lookup(namespaces, vary_on_user)
+                    if response is not None:
+                        return response
+                    response = make_response(await f(*args, **kwargs))
+                    self._store(key, response)
+                    return response
+                return decorated_async
+
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                key, response = self._lookup(namespaces, vary_on_user)
+                if response is not None:
+                    return response
+                response = make_response(f(*args, **kwargs))
+                self._store(key, response)
+                return response
+            return decorated
+        return decorator
+
+    def _lookup(self, namespaces, vary_on_user):
+        """
+        :return: (缓存键, 命中的响应)；不使用缓存时缓存键为 None，未命中时响应为 None
+        """
+        if self.backend is None or request.method != 'GET' or '_flashes' in session:
+            return None, None
+        key = self.make_key(*namespaces, vary_on_user=vary_on_user)
+        cached = self.backend.get(key)
+        if cached is None:
+            return key, None
+        body, status, headers = cached
+        return key, current_app.response_class(body, status=status, headers=headers)
+
+    def _store(self, key, response):
+        # 流式响应不缓存，否则要先读完整个响应体，失去流式的意义
+        if key is not None and response.status_code == 200 and \
+                not response.direct_passthrough and not response.is_streamed:
+            headers = [(k, v) for k, v in response.headers
+                       if k.lower() in ('content-type', 'location')]
+            self.backend.set(key, (response.get_data(), response.status_code, headers),
+                             self.ttl())
+
+cache = Cache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(db_session):
+    namespaces = db_session.info.pop('cache_invalidate', None)
+    if namespaces:
+        cache.invalidate(*namespaces)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_invalidation(db_session):
+    db_session.info.pop('cache_invalidate', None)
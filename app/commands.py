@@ -0,0 +1,49 @@
+import time
+
+import click
+
+from app.models import User
+from app.revocation import RevocationList
+from app.search import search_index
+from app.tasks import MemoryBackend, task_queue
+
+
+def init_app(app):
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters():
+        """按实际数据修复用户的文章数、粉丝数和关注数"""
+        fixed = User.reconcile_counters()
+        click.echo('reconciled counters for {} user(s)'.format(fixed))
+
+    @app.cli.command('purge-revoked-tokens')
+    def purge_revoked_tokens():
+        """删除已经过期的令牌吊销记录"""
+        purged = RevocationList.purge()
+        click.echo('purged {} expired revoked token(s)'.format(purged))
+
+    @app.cli.command('reindex-posts')
+    def reindex_posts():
+        """从 post 表重建全文搜索索引"""
+        indexed = search_index.rebuild()
+        click.echo('indexed {} post(s)'.format(indexed))
+
+    @app.cli.command('run-worker')
+    @click.option('--threads', default=1, show_default=True, help='执行任务的线程数')
+    @click.option('--burst', is_flag=True, help='执行完到期的任务后退出')
+    def run_worker(threads, burst):
+        """执行后台任务队列中的任务"""
+        if isinstance(task_queue.backend, MemoryBackend):
+            raise click.UsageError('the memory task queue can only be consumed in-process')
+        if burst:
+            done = task_queue.work(burst=True)
+            click.echo('ran {} task(s)'.format(done))
+            return
+        task_queue.start(threads)
+        click.echo('worker started with {} thread(s), press Ctrl+C to stop'.format(threads))
+        try:
+            while task_queue.running():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            click.echo('stopping, waiting for running tasks')
+        finally:
+            task_queue.stop()
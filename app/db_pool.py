@@ -0,0 +1,127 @@
+"""
+数据库连接池配置与监控。
+根据 DB_POOL_* 配置生成 SQLALCHEMY_ENGINE_OPTIONS，
+并用带统计的 QueuePool 记录借出数、溢出数、取连接等待时间分布和超时次数，
+供 /admin/stats/pool 查看或按 DB_POOL_LOG_INTERVAL 定期写入日志。
+"""
+import bisect
+import logging
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# 等待时间直方图的桶上界（毫秒），最后一个桶收集更慢的请求
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolStats(object):
+    """单个连接池的累计统计，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record(self, waited):
+        ms = waited * 1000
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.histogram[bisect.bisect_left(WAIT_BUCKETS_MS, ms)] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = ['<={}ms'.format(b) for b in WAIT_BUCKETS_MS] + \
+                ['>{}ms'.format(WAIT_BUCKETS_MS[-1])]
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': round(self.wait_total * 1000 / self.checkouts, 3)
+                if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'wait_histogram_ms': dict(zip(labels, self.histogram)),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录每次取连接等待时间的 QueuePool"""
+
+    log_interval = 0
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        self._last_log = time.monotonic()
+
+    def recreate(self):
+        # recreate() 会新建实例，沿用同一个统计对象
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super(InstrumentedQueuePool, self).connect()
+        except exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record(time.perf_counter() - start)
+        if self.log_interval and time.monotonic() - self._last_log >= self.log_interval:
+            self._last_log = time.monotonic()
+            logger.info('db pool %s', pool_status(self))
+        return conn
+
+
+def pool_status(pool):
+    """
+    连接池当前状态和累计统计
+    :param pool: engine.pool
+    """
+    data = {
+        'class': type(pool).__name__,
+        'status': pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        data.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        data.update(stats.snapshot())
+    return data
+
+
+def configure_pool(app):
+    """
+    在 db.init_app 之前调用，把 DB_POOL_* 配置转换成 SQLALCHEMY_ENGINE_OPTIONS。
+    已显式设置的 SQLALCHEMY_ENGINE_OPTIONS 项优先。SQLite 由 Flask-SQLAlchemy 选择连接池，这里只开启 pre-ping。
+    """
+    config = app.config
+    options = {'pool_pre_ping': config.get('DB_POOL_PRE_PING', True)}
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        InstrumentedQueuePool.log_interval = config.get('DB_POOL_LOG_INTERVAL', 0)
+        options.update({
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': config.get('DB_POOL_SIZE', 5),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': config.get('DB_POOL_RECYCLE', 3600),
+        })
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
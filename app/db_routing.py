@@ -0,0 +1,206 @@
+"""
+读写分离。
+SQLALCHEMY_REPLICA_URIS 中的只读副本注册为 replica_0、replica_1 ... 等 bind，
+GET/HEAD/OPTIONS 请求中的 SELECT 轮流发往健康的副本，写操作和写之后的查询都走主库。
+
+- 写后读一致：请求写过数据库后，该客户端在 REPLICA_PIN_SECONDS 内的请求都读主库。
+  到期时间签名后放在 cookie 和 X-DB-Pin 响应头中由客户端带回（跨 worker 进程有效），
+  不带 cookie 的 API 客户端可以把 X-DB-Pin 原样放进之后的请求头；
+- 健康检查：选用副本前，距上次检查超过 REPLICA_HEALTH_CHECK_INTERVAL 时执行一次 SELECT 1；
+  检查失败或查询出错的副本在 REPLICA_RETRY_INTERVAL 内不再使用，没有可用副本时读主库；
+  请求中副本查询出错时回滚只读事务，改到主库重试这条查询。
+
+本地测试可以用几个 SQLite 文件代替副本。
+"""
+import itertools
+import logging
+import threading
+import time
+
+from flask import current_app, request
+from itsdangerous import BadData, URLSafeSerializer
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, ProgrammingError
+from sqlalchemy.sql import Select
+
+logger = logging.getLogger(__name__)
+
+_READ_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+PIN_COOKIE = 'db_pin'
+PIN_HEADER = 'X-DB-Pin'
+# 语句本身的错误，换到主库执行也一样会失败
+_STATEMENT_ERRORS = (DataError, IntegrityError, ProgrammingError)
+
+
+class RoutingSession(Session):
+    """
+    info['replica'] 为副本引擎时，不在 flush 中的 SELECT 发往该副本；
+    一旦在会话中写过数据，之后的查询都回到主库。副本出错时改读主库
+    """
+
+    def execute(self, statement, *args, **kwargs):
+        replica = self.info.get('replica')
+        if replica is None or not isinstance(statement, Select) or not self._is_clean():
+            return super(RoutingSession, self).execute(statement, *args, **kwargs)
+        try:
+            return super(RoutingSession, self).execute(statement, *args, **kwargs)
+        except DBAPIError as e:
+            if isinstance(e, _STATEMENT_ERRORS):
+                raise
+            # 副本不可用：暂停使用该副本，回滚只读的事务后改读主库重试
+            replica_router.mark_down(self.info.get('replica_key'))
+            self.rollback()
+            self.info['replica'] = None
+            return super(RoutingSession, self).execute(statement, *args, **kwargs)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing and \
+                isinstance(clause, Select):
+            return replica
+        return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, bind=bind,
+                                                    **kwargs)
+
+
+def configure_replicas(app):
+    """
+    在 db.init_app 之前调用，把 SQLALCHEMY_REPLICA_URIS 加入 SQLALCHEMY_BINDS
+    """
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for i, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or ()):
+        binds['replica_{}'.format(i)] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+class ReplicaRouter(object):
+    """
+    配置项：
+    SQLALCHEMY_REPLICA_URIS: 只读副本的连接串列表，为空时所有查询都走主库
+    REPLICA_PIN_SECONDS: 写操作之后读主库的秒数
+    REPLICA_HEALTH_CHECK_INTERVAL: 副本健康检查的最小间隔
+    REPLICA_RETRY_INTERVAL: 副本出错后暂停使用的秒数
+    """
+
+    def __init__(self, app=None):
+        self.keys = []
+        self.pin_seconds = 5
+        self._cycle = None
+        self._lock = threading.Lock()
+        self._checked = {}
+        self._down_until = {}
+        self._routed = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.keys = ['replica_{}'.format(i)
+                     for i in range(len(app.config.get('SQLALCHEMY_REPLICA_URIS') or ()))]
+        self.pin_seconds = app.config.get('REPLICA_PIN_SECONDS', 5)
+        self.check_interval = app.config.get('REPLICA_HEALTH_CHECK_INTERVAL', 10)
+        self.retry_interval = app.config.get('REPLICA_RETRY_INTERVAL', 30)
+        self._cycle = itertools.cycle(self.keys)
+        self._routed = dict.fromkeys(['primary'] + self.keys, 0)
+        app.extensions['replica_router'] = self
+        if not self.keys:
+            return
+        app.before_request(self._route_request)
+        app.after_request(self._pin_after_write)
+
+    def choose(self):
+        """
+        轮询选一个健康的副本
+        :return: (bind 名, 引擎)，没有可用副本时返回 (None, None)
+        """
+        from app.models import db
+        for _ in range(len(self.keys)):
+            with self._lock:
+                key = next(self._cycle)
+            if self._healthy(key, db.engines[key]):
+                return key, db.engines[key]
+        return None, None
+
+    def _healthy(self, key, engine):
+        now = time.monotonic()
+        if self._down_until.get(key, 0) > now:
+            return False
+        if now - self._checked.get(key, 0) < self.check_interval:
+            return True
+        self._checked[key] = now
+        try:
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+        except Exception:
+            self.mark_down(key)
+            return False
+        return True
+
+    def mark_down(self, key):
+        """副本出错，暂停使用 REPLICA_RETRY_INTERVAL 秒"""
+        if self._down_until.get(key, 0) <= time.monotonic():
+            logger.warning('read replica %s is unavailable', key)
+        self._down_until[key] = time.monotonic() + self.retry_interval
+
+    @staticmethod
+    def _serializer():
+        return URLSafeSerializer(current_app.secret_key, salt='db-pin')
+
+    def _pinned(self):
+        token = request.cookies.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+        if not token:
+            return False
+        try:
+            expires = self._serializer().loads(token)
+        except BadData:
+            return False
+        return isinstance(expires, (int, float)) and expires > time.time()
+
+    def _route_request(self):
+        from app.models import db
+        key, engine = None, None
+        if request.method in _READ_METHODS and not self._pinned():
+            key, engine = self.choose()
+        db.session.info['replica'] = engine
+        db.session.info['replica_key'] = key
+        with self._lock:
+            self._routed[key or 'primary'] += 1
+
+    def _pin_after_write(self, response):
+        from app.models import db
+        if db.session.info.get('wrote') and self.pin_seconds > 0:
+            token = self._serializer().dumps(time.time() + self.pin_seconds)
+            response.set_cookie(PIN_COOKIE, token, max_age=self.pin_seconds,
+                                httponly=True, samesite='Lax')
+            response.headers[PIN_HEADER] = token
+        return response
+
+    def status(self):
+        """各副本的可用状态和请求分配次数"""
+        now = time.monotonic()
+        with self._lock:
+            routed = dict(self._routed)
+        return {
+            'replicas': {key: {'available': self._down_until.get(key, 0) <= now,
+                               'requests': routed.get(key, 0)} for key in self.keys},
+            'primary_requests': routed.get('primary', 0),
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    _stick_to_primary(db_session)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _on_execute(orm_execute_state):
+    if not orm_execute_state.is_select:
+        _stick_to_primary(orm_execute_state.session)
+
+
+def _stick_to_primary(db_session):
+    # 写过数据后，本请求余下的查询读主库，响应时把客户端固定到主库一段时间
+    db_session.info['replica'] = None
+    db_session.info['wrote'] = True
@@ -0,0 +1,30 @@
+"""
+视图共用的装饰器
+"""
+from functools import wraps
+
+from flask import abort, current_app, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_login import current_user
+
+from app.models import db, User
+
+
+def admin_required(f):
+    """
+    只允许 ADMIN_USERNAMES 中的用户访问，其他用户返回 403。
+    放在 login_required 或 jwt_required 之后：请求带有 JWT 时按 JWT 对应的用户判断，否则按登录用户判断
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if verify_jwt_in_request(optional=True):
+            user = db.session.get(User, int(get_jwt_identity()))
+        else:
+            user = current_user if current_user.is_authenticated else None
+        if user is None or user.username not in current_app.config.get('ADMIN_USERNAMES', ()):
+            if request.path.startswith('/api/'):
+                from app.api_1_0.errors import error_response
+                return error_response(403, 'administrator privileges required')
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated
@@ -1,6 +1,9 @@
-from flask import render_template, request, jsonify
+from flask import current_app, render_template, request, jsonify
 
+from app.api_1_0.errors import error_response
+from app.hashing import HasherBusy
 from app.models import db
+from app.ratelimit import RateLimitExceeded
 
 from app.errors import bp
 
@@ -17,4 +20,29 @@ def not_found_error(error):
 @bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
-    return render_template('500.html'), 500
\ No newline at end of file
+    return render_template('500.html'), 500
+
+
+@bp.app_errorhandler(HasherBusy)
+def hasher_busy_error(error):
+    # 密码哈希队列已满，让客户端稍后重试
+    if request.path.startswith('/api/') or (request.accept_mimetypes.accept_json and
+                                            not request.accept_mimetypes.accept_html):
+        response = error_response(503, 'server is busy, please retry later')
+    else:
+        response = current_app.make_response((render_template('503.html'), 503))
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+@bp.app_errorhandler(RateLimitExceeded)
+def rate_limit_error(error):
+    # 超过限流，告诉客户端多久之后可以重试
+    if request.path.startswith('/api/') or (request.accept_mimetypes.accept_json and
+                                            not request.accept_mimetypes.accept_html):
+        response = error_response(429, 'too many requests, please retry later')
+    else:
+        response = current_app.make_response(
+            (render_template('429.html', retry_after=error.retry_after), 429))
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
@@ -0,0 +1,180 @@
+"""
+关注关系图。
+User.is_following 原来每次执行一条 COUNT 查询，判断 N 个用户是否已关注就是 N 条查询。
+这里按用户缓存其关注的用户 id，存为有序的整数数组（array('q')，每个 id 8 字节），
+判断是否关注只需在数组上二分查找，一组用户也只在缓存未命中时查询一次。
+互相关注和"关注的人也关注了"推荐都在这些有序数组上计算。
+follow/unfollow 所在的事务内不读写缓存，直接查询数据库；提交后再删除相关条目，
+其他进程中的修改最迟在 TTL 后生效。
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache import LRUBackend
+
+# 缓存键：某用户关注的人 / 某用户的粉丝
+_FOLLOWING = 'following'
+_FOLLOWERS = 'followers'
+
+
+def _contains(ids, value):
+    i = bisect_left(ids, value)
+    return i < len(ids) and ids[i] == value
+
+
+def _intersect(a, b):
+    """两个有序数组的交集，按大小较小的数组在另一个上二分查找"""
+    if len(a) > len(b):
+        a, b = b, a
+    return [value for value in a if _contains(b, value)]
+
+
+class FollowGraph(object):
+    """
+    配置项：
+    FOLLOW_GRAPH_CACHE_TTL: 缓存条目的过期秒数，<= 0 时关闭缓存，每次都查询数据库
+    FOLLOW_GRAPH_MAX_ENTRIES: 最多缓存的数组个数
+    FOLLOW_SUGGESTIONS_LIMIT: 推荐关注默认返回的人数
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 0
+        self.suggestions_limit = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('FOLLOW_GRAPH_CACHE_TTL', 300)
+        max_entries = app.config.get('FOLLOW_GRAPH_MAX_ENTRIES', 10000)
+        self.suggestions_limit = app.config.get('FOLLOW_SUGGESTIONS_LIMIT', 10)
+        self.backend = LRUBackend(max_entries) if self.ttl > 0 else None
+        app.extensions['follow_graph'] = self
+
+    def _cacheable(self, db_session):
+        # 当前事务改过关注关系时，查询结果含未提交的数据，不能读也不能写缓存
+        return self.backend is not None and not db_session.info.get('follow_graph_invalidate')
+
+    def _load(self, kind, user_ids):
+        """
+        批量取有序 id 数组，缓存未命中的用户合并成一次查询
+        :param kind: _FOLLOWING 或 _FOLLOWERS
+        :return: {user_id: array}
+        """
+        from app.models import db, followers
+        cacheable = self._cacheable(db.session)
+        result, missing = {}, []
+        for user_id in dict.fromkeys(user_ids):
+            ids = self.backend.get((kind, user_id)) if cacheable else None
+            if ids is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = ids
+        if missing:
+            if kind == _FOLLOWING:
+                owner, other = followers.c.follower_id, followers.c.followed_id
+            else:
+                owner, other = followers.c.followed_id, followers.c.follower_id
+            for user_id in missing:
+                result[user_id] = array('q')
+            rows = db.session.execute(
+                db.select(owner, other).where(owner.in_(missing)).order_by(owner, other))
+            for user_id, other_id in rows:
+                result[user_id].append(other_id)
+            if cacheable:
+                for user_id in missing:
+                    self.backend.set((kind, user_id), result[user_id], self.ttl)
+        return result
+
+    def following_ids(self, user_id):
+        """
+        :return: user_id 关注的用户 id，有序数组，不要修改
+        """
+        return self._load(_FOLLOWING, [user_id])[user_id]
+
+    def follower_ids(self, user_id):
+        """
+        :return: 关注 user_id 的用户 id，有序数组，不要修改
+        """
+        return self._load(_FOLLOWERS, [user_id])[user_id]
+
+    def is_following(self, user_id, target_id):
+        """判断 user_id 是否关注了 target_id"""
+        return target_id in self.following_among(user_id, [target_id])
+
+    def following_among(self, user_id, target_ids):
+        """
+        一次判断是否关注了一组用户
+        :param target_ids: 要判断的用户 id
+        :return: 其中已关注的用户 id 集合
+        """
+        from app.models import db, followers
+        target_ids = list(target_ids)
+        if not target_ids:
+            return set()
+        if not self._cacheable(db.session):
+            # 只查这几个目标，会话会先 flush 本事务中新增或删除的关注关系
+            rows = db.session.execute(db.select(followers.c.followed_id).where(
+                followers.c.follower_id == user_id, followers.c.followed_id.in_(target_ids)))
+            return {row[0] for row in rows}
+        ids = self.following_ids(user_id)
+        return {target_id for target_id in target_ids if _contains(ids, target_id)}
+
+    def mutuals(self, user_id):
+        """
+        与 user_id 互相关注的用户
+        :return: 有序的用户 id 列表
+        """
+        return _intersect(self.following_ids(user_id), self.follower_ids(user_id))
+
+    def suggestions(self, user_id, limit=None):
+        """
+        推荐关注：user_id 关注的人所关注、而 user_id 还没有关注的用户，
+        按共同关注人数从多到少排序，人数相同时 id 小的在前
+        :param limit: 最多返回的人数，默认 FOLLOW_SUGGESTIONS_LIMIT
+        :return: [(用户 id, 共同关注人数)]
+        """
+        limit = self.suggestions_limit if limit is None else limit
+        following = self.following_ids(user_id)
+        if not following or limit <= 0:
+            return []
+        counts = Counter()
+        for ids in self._load(_FOLLOWING, following).values():
+            counts.update(ids)
+        candidates = [(candidate, count) for candidate, count in counts.items()
+                      if candidate != user_id and not _contains(following, candidate)]
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        return candidates[:limit]
+
+    def forget(self, follower_id, followed_id):
+        """立即删除一条关注关系两端的缓存数组"""
+        if self.backend is not None:
+            self.backend.delete((_FOLLOWING, follower_id))
+            self.backend.delete((_FOLLOWERS, followed_id))
+
+    def invalidate_on_commit(self, db_session, follower_id, followed_id):
+        """
+        关注关系变化时调用：本事务余下的查询绕过缓存，提交后删除相关的缓存数组
+        :param db_session: 当前数据库会话
+        """
+        db_session.info.setdefault('follow_graph_invalidate', set()).add(
+            (follower_id, followed_id))
+
+
+follow_graph = FollowGraph()
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_after_commit(db_session):
+    edges = db_session.info.pop('follow_graph_invalidate', None)
+    for follower_id, followed_id in edges or ():
+        follow_graph.forget(follower_id, followed_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_forget(db_session):
+    db_session.info.pop('follow_graph_invalidate', None)
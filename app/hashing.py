@@ -0,0 +1,155 @@
+"""
+密码哈希服务。
+PBKDF2/scrypt 是 CPU 密集计算，放到有界的进程池里执行，请求线程只等待结果；
+排队的任务超过上限时立即抛出 HasherBusy，由错误处理返回 503 和 Retry-After，
+而不是让所有请求的延迟一起上涨。
+哈希算法和强度按环境配置，登录时发现旧参数生成的哈希会自动用新参数重新计算。
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """哈希任务队列已满"""
+
+    def __init__(self, retry_after):
+        super(HasherBusy, self).__init__('password hashing queue is full')
+        self.retry_after = retry_after
+
+
+class PasswordHasher(object):
+    """
+    配置项：
+    PASSWORD_HASH_METHOD: werkzeug 的哈希方法，如 'scrypt' 或 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_SALT_LENGTH: 盐长度
+    PASSWORD_HASH_WORKERS: 进程池大小，0 表示在请求线程中直接计算
+    PASSWORD_HASH_MAX_PENDING: 同时在计算和排队的任务上限
+    PASSWORD_HASH_QUEUE_TIMEOUT: 队列满时最多等待的秒数，超时后返回 503
+    PASSWORD_HASH_RETRY_AFTER: 503 响应中 Retry-After 的秒数
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt'
+        self.salt_length = 16
+        self.workers = 0
+        self.queue_timeout = 0.0
+        self.retry_after = 1
+        self._canonical = None
+        self._slots = None
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        self.salt_length = app.config.get('PASSWORD_HASH_SALT_LENGTH', 16)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self.queue_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 0.0)
+        self.retry_after = app.config.get('PASSWORD_HASH_RETRY_AFTER', 1)
+        max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING') or self.workers * 4
+        self._slots = threading.BoundedSemaphore(max_pending) if self.workers else None
+        # 用当前参数生成一次哈希，取出规范化的方法前缀，如 'scrypt:32768:8:1'
+        self._canonical = generate_password_hash('', self.method, self.salt_length).split('$', 1)[0]
+        app.extensions['hasher'] = self
+
+    def hash(self, password):
+        """
+        计算密码哈希
+        :param password: 明文密码
+        :raises HasherBusy: 队列已满
+        """
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """
+        校验密码
+        :raises HasherBusy: 队列已满
+        """
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash_many(self, passwords):
+        """
+        批量计算哈希，队列满时等待而不是失败，用于批量导入等后台任务
+        :return: 与 passwords 顺序一致的哈希列表
+        """
+        futures = [self._submit(True, generate_password_hash, password, self.method,
+                                self.salt_length) for password in passwords]
+        return [future.result() for future in futures]
+
+    async def hash_async(self, password):
+        """
+        异步视图使用的 hash，等待结果时不阻塞事件循环
+        :raises HasherBusy: 队列已满
+        """
+        return await self._run_async(generate_password_hash, password, self.method,
+                                     self.salt_length)
+
+    async def verify_async(self, pwhash, password):
+        """
+        异步视图使用的 verify
+        :raises HasherBusy: 队列已满
+        """
+        if not pwhash:
+            return False
+        return await self._run_async(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """哈希是否由与当前配置不同的算法或参数生成"""
+        return bool(pwhash) and pwhash.split('$', 1)[0] != self._canonical
+
+    def _run(self, func, *args):
+        return self._submit(False, func, *args).result()
+
+    async def _run_async(self, func, *args):
+        if not self.workers:
+            # 没有进程池时放到线程池计算，不在事件循环线程里做 CPU 密集计算
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+        if self.queue_timeout:
+            # 等待空位也不能阻塞事件循环
+            future = await asyncio.get_running_loop().run_in_executor(
+                None, self._submit, False, func, *args)
+        else:
+            future = self._submit(False, func, *args)
+        return await asyncio.wrap_future(future)
+
+    def _submit(self, block, func, *args):
+        if not self.workers:
+            future = Future()
+            future.set_result(func(*args))
+            return future
+        if block:
+            acquired = self._slots.acquire()
+        elif self.queue_timeout:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            raise HasherBusy(self.retry_after)
+        try:
+            future = self._executor().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _executor(self):
+        # 进程池在首次使用时创建；fork 出的 worker 进程各自重建自己的池
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pool_pid = pid
+        return self._pool
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,166 @@
+"""
+API 响应的 JSON 编码。
+按 JSON_ENCODER 选择编码器：'orjson'、'msgspec' 或 'stdlib'，'auto' 时按此顺序选第一个已安装的。
+orjson/msgspec 直接输出 UTF-8 字节并原生处理 datetime，比标准库快一个数量级。
+JSON_DATETIME_FORMAT 为 'http' 时时间沿用 Flask 默认的 RFC 822 格式（与原有 API 兼容），
+为 'iso' 时输出带时区的 ISO 8601。
+大的集合响应可以按条编码、分块发送，不必先在内存中拼出整个响应体。
+"""
+from datetime import date, datetime, UTC
+
+from flask import current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+_WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def _http_default(value):
+    # 与 werkzeug.http.http_date 输出相同，直接拼字符串，比 email.utils 快得多
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(UTC)
+        return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+            _WEEKDAYS[value.weekday()], value.day, _MONTHS[value.month - 1], value.year,
+            value.hour, value.minute, value.second)
+    return DefaultJSONProvider.default(value)
+
+
+def _iso_default(value):
+    # 数据库中的时间都是不带时区的 UTC 时间
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=UTC)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    配置项：
+    JSON_ENCODER: 'auto'、'orjson'、'msgspec' 或 'stdlib'
+    JSON_DATETIME_FORMAT: 'http' 或 'iso'，msgspec 只支持 'iso'
+    JSON_SORT_KEYS: 是否按键排序
+    JSON_COMPACT: True 输出紧凑格式，None 时仅在调试模式下缩进
+    JSON_STREAM_THRESHOLD: 集合条数达到该值时分块发送，0 表示不分块
+    JSON_STREAM_CHUNK_SIZE: 分块发送时每块包含的条数
+    """
+
+    def __init__(self, app):
+        super(FastJSONProvider, self).__init__(app)
+        self.datetime_format = app.config.get('JSON_DATETIME_FORMAT', 'http')
+        self.sort_keys = app.config.get('JSON_SORT_KEYS', True)
+        self.compact = app.config.get('JSON_COMPACT')
+        self.stream_threshold = app.config.get('JSON_STREAM_THRESHOLD', 0)
+        self.stream_chunk_size = app.config.get('JSON_STREAM_CHUNK_SIZE', 100)
+        self.default = _iso_default if self.datetime_format == 'iso' else _http_default
+        self.encoder = self._select_encoder(app.config.get('JSON_ENCODER', 'auto'))
+        self._encode = getattr(self, '_encode_' + self.encoder)
+        if self.encoder == 'msgspec':
+            self._msgspec = msgspec.json.Encoder(enc_hook=self.default)
+
+    def _select_encoder(self, name):
+        available = {
+            'orjson': orjson is not None,
+            # msgspec 总是把 datetime 编码成 ISO 8601
+            'msgspec': msgspec is not None and self.datetime_format == 'iso',
+            'stdlib': True,
+        }
+        if name == 'auto':
+            return next(encoder for encoder, ok in available.items() if ok)
+        if not available.get(name):
+            raise RuntimeError('JSON encoder {!r} is not available'.format(name))
+        return name
+
+    def dumps_bytes(self, obj):
+        """编码为紧凑的 UTF-8 字节"""
+        return self._encode(obj)
+
+    def _encode_orjson(self, obj):
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if self.datetime_format == 'http':
+            # 交给 default 按 HTTP 日期格式输出
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def _encode_msgspec(self, obj):
+        # msgspec 原生编码 datetime，不经过 enc_hook，且 UTC 写成 Z；先按 _iso_default 转成字符串，与 orjson 输出一致
+        return self._msgspec.encode(_for_msgspec(obj, self.sort_keys))
+
+    def _encode_stdlib(self, obj):
+        return super(FastJSONProvider, self).dumps(
+            obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            # 调试模式需要缩进，走标准库
+            return super(FastJSONProvider, self).response(*args, **kwargs)
+        if args and kwargs:
+            raise TypeError('response() takes either args or kwargs, not both')
+        if len(args) == 1:
+            obj = args[0]
+        else:
+            obj = args or kwargs or None
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+    def stream(self, data, items_key='items'):
+        """
+        分块发送集合响应：先发送 items 中的条目，每 JSON_STREAM_CHUNK_SIZE 条编码一次，最后发送其余字段
+        :param data: to_collection_dict 等返回的字典，items 必须是列表
+        """
+        items = data[items_key]
+        rest = {k: v for k, v in data.items() if k != items_key}
+        size = self.stream_chunk_size
+
+        def generate():
+            yield b'{' + self.dumps_bytes(items_key) + b':['
+            for start in range(0, len(items), size):
+                chunk = self.dumps_bytes(items[start:start + size])[1:-1]
+                yield (b',' if start else b'') + chunk
+            tail = self.dumps_bytes(rest)
+            yield b']' + (b',' + tail[1:] if len(tail) > 2 else b'}') + b'\n'
+
+        return self._app.response_class(stream_with_context(generate()), mimetype=self.mimetype)
+
+
+def _for_msgspec(obj, sort_keys):
+    if isinstance(obj, dict):
+        keys = sorted(obj) if sort_keys else obj
+        return {k: _for_msgspec(obj[k], sort_keys) for k in keys}
+    if isinstance(obj, (list, tuple)):
+        return [_for_msgspec(v, sort_keys) for v in obj]
+    if isinstance(obj, datetime):
+        return _iso_default(obj)
+    return obj
+
+
+def collection_response(data, items_key='items'):
+    """
+    集合接口的响应：条目数达到 JSON_STREAM_THRESHOLD 时分块发送，否则一次编码
+    :param data: to_collection_dict 等返回的字典
+    """
+    provider = current_app.json
+    threshold = getattr(provider, 'stream_threshold', 0)
+    items = data.get(items_key)
+    if threshold and isinstance(items, list) and len(items) >= threshold:
+        return provider.stream(data, items_key)
+    return provider.response(data)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,151 @@
+import atexit
+import threading
+import weakref
+from datetime import datetime, UTC
+
+from flask import current_app
+from sqlalchemy import case, update
+
+from app.models import db, User
+
+
+class _AppState(object):
+    """一个应用的写回缓冲和后台线程，保存在 app.extensions['last_seen'] 中"""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config.get('LAST_SEEN_FLUSH_INTERVAL', 30)
+        self.batch_size = app.config.get('LAST_SEEN_BATCH_SIZE', 500)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+
+class LastSeenTracker(object):
+    """
+    用户最后访问时间的写回（write-behind）缓冲。
+    请求只在进程内记录时间戳，同一用户多次访问只保留最新值，
+    由后台线程按固定间隔或缓冲达到批量上限时用一条多行 UPDATE 写回数据库。
+    每个应用的缓冲分开保存，测试或同一进程中的多个应用互不影响。
+    """
+
+    def __init__(self, app=None):
+        self._states = weakref.WeakSet()
+        self._atexit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        state = _AppState(app)
+        app.extensions['last_seen'] = state
+        self._states.add(state)
+        if not self._atexit_registered:
+            # 进程退出前保证所有应用缓冲中的时间戳落库
+            atexit.register(self._stop_all)
+            self._atexit_registered = True
+
+    @staticmethod
+    def _state(app=None):
+        return (app or current_app).extensions['last_seen']
+
+    def touch(self, user_id, when=None, app=None):
+        """
+        记录一次用户访问
+        :param user_id: 用户 id
+        :param when: 访问时间，默认当前 UTC 时间
+        :param app: 所属应用，默认当前应用
+        """
+        state = self._state(app)
+        when = when or datetime.now(UTC)
+        if state.interval <= 0:
+            self._write(state, {user_id: when})
+            return
+        with state.lock:
+            state.pending[user_id] = when
+            full = len(state.pending) >= state.batch_size
+        self._ensure_thread(state)
+        if full:
+            state.wakeup.set()
+
+    def flush(self, app=None):
+        """
+        立即把缓冲中的时间戳写回数据库
+        :param app: 所属应用，默认当前应用
+        :return: 本次写回的用户数
+        """
+        return self._flush(self._state(app))
+
+    def stop(self, app=None):
+        """
+        停止后台线程并写回剩余数据
+        :param app: 所属应用，默认当前应用
+        """
+        self._stop(self._state(app))
+
+    def _flush(self, state):
+        with state.lock:
+            pending, state.pending = state.pending, {}
+        if not pending:
+            return 0
+        items = list(pending.items())
+        for start in range(0, len(items), state.batch_size):
+            batch = dict(items[start:start + state.batch_size])
+            try:
+                self._write(state, batch)
+            except Exception:
+                # 写库失败时放回缓冲，不覆盖期间新记录的时间戳
+                with state.lock:
+                    for user_id, when in items[start:]:
+                        state.pending.setdefault(user_id, when)
+                raise
+        return len(pending)
+
+    def _stop(self, state):
+        state.stopped.set()
+        state.wakeup.set()
+        if state.thread is not None and state.thread is not threading.current_thread():
+            state.thread.join(timeout=5)
+        self._flush(state)
+
+    def _stop_all(self):
+        for state in list(self._states):
+            try:
+                self._stop(state)
+            except Exception:
+                state.app.logger.exception('last_seen flush failed')
+
+    @staticmethod
+    def _write(state, batch):
+        # 一条 UPDATE ... SET last_seen = CASE id WHEN ... END WHERE id IN (...)
+        table = User.__table__
+        stmt = update(table).where(table.c.id.in_(list(batch))).values(
+            last_seen=case(batch, value=table.c.id)
+        )
+        with state.app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+
+    def _ensure_thread(self, state):
+        if state.thread is not None and state.thread.is_alive():
+            return
+        with state.lock:
+            if state.thread is not None and state.thread.is_alive():
+                return
+            state.stopped.clear()
+            state.thread = threading.Thread(target=self._run, args=(state,),
+                                            name='last-seen-flusher', daemon=True)
+            state.thread.start()
+
+    def _run(self, state):
+        while not state.stopped.is_set():
+            state.wakeup.wait(state.interval)
+            state.wakeup.clear()
+            try:
+                self._flush(state)
+            except Exception:
+                state.app.logger.exception('last_seen flush failed')
+
+
+last_seen_tracker = LastSeenTracker()
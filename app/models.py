@@ -1,38 +1,162 @@
+import time
 from datetime import datetime
+from functools import lru_cache
 
-from flask import url_for
+from flask import current_app, g, url_for
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import validates
+from sqlalchemy.orm.attributes import set_committed_value
 from hashlib import md5
-db = SQLAlchemy()
+
+from app.cache import cache
+from app.db_routing import RoutingSession
+from app.follow_graph import follow_graph
+from app.hashing import hasher
+from app.pagination import keyset_page
+from app.search import search_index
+from app.tasks import task_queue
+from app.user_cache import user_cache
+
+# 读请求的查询可以路由到只读副本，见 app/db_routing.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 # from app import login
 
 
 
+def email_digest(email):
+    """
+    计算 Gravatar 使用的邮箱摘要
+    :param email: 邮箱地址
+    :return: 小写邮箱的 md5 十六进制摘要
+    """
+    return md5(email.lower().encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def _gravatar_url(digest, size):
+    return 'https://www.gravatar.com/avatar/{}?d=identicon&s={}'.format(digest, size)
+
+
 class PaginatedAPIMixin(object):
-    @staticmethod
-    def to_collection_dict(query, page, per_page, endpoint, **kwargs):
-        resources = query.paginate(page = page, per_page = per_page, error_out = False)
+    # count='cached' 时总数缓存的秒数
+    COUNT_CACHE_TTL = 30
+    _count_cache = {}
+
+    @classmethod
+    def to_dict_batch(cls, items):
+        """
+        批量序列化一页数据，子类可覆盖此钩子，
+        对整页数据按关联关系各做一次分组查询预取聚合值，避免逐条查询
+        :param items: 当前页的模型对象列表
+        :return: 与 items 顺序一致的字典列表
+        """
+        return [item.to_dict() for item in items]
+
+    @classmethod
+    def to_collection_dict(cls, query, page, per_page, endpoint, count=True, serialize=None,
+                           **kwargs):
+        """
+        分页序列化集合
+        :param count: True 每次统计总数；'cached' 在 COUNT_CACHE_TTL 秒内复用总数；
+                      False 不统计总数，多取一行判断是否有下一页
+        :param serialize: 把一页数据转换成响应中 items 的函数，默认 to_dict_batch
+        """
+        if count is False:
+            rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+            items = rows[:per_page]
+            has_next = len(rows) > per_page
+            total = pages = None
+        else:
+            total = cls._cached_count(query) if count == 'cached' else None
+            resources = query.paginate(page=page, per_page=per_page, error_out=False,
+                                       count=total is None)
+            if total is not None:
+                resources.total = total
+            items = resources.items
+            has_next = resources.has_next
+            total, pages = resources.total, resources.pages
+        return cls.collection_dict(items, page, per_page, total, pages, has_next, endpoint,
+                                   serialize=serialize, **kwargs)
+
+    @classmethod
+    def collection_dict(cls, items, page, per_page, total, pages, has_next, endpoint,
+                        serialize=None, **kwargs):
+        """
+        由已取出的一页数据组装页码分页的响应，异步视图自己执行查询后也用它
+        """
         data = {
-            'items': [item.to_dict() for item in resources.items],
+            'items': (serialize or cls.to_dict_batch)(items),
             '_meta': {
                 'page': page,
                 'per_page': per_page,
-                'total_pages': resources.pages,
-                'total_items': resources.total
+                'total_pages': pages,
+                'total_items': total
             },
             '_links': {
                 'self': url_for(endpoint, page=page, per_page=per_page,
                                 **kwargs),
                 'next': url_for(endpoint, page=page + 1, per_page=per_page,
-                                **kwargs) if resources.has_next else None,
+                                **kwargs) if has_next else None,
                 'prev': url_for(endpoint, page=page - 1, per_page=per_page,
-                                **kwargs) if resources.has_prev else None
+                                **kwargs) if page > 1 else None
+            }
+        }
+        return data
+
+    @classmethod
+    def to_cursor_dict(cls, query, keys, cursor, per_page, endpoint, descending=True,
+                       serialize=None, **kwargs):
+        """
+        键集（游标）分页序列化集合，链接中携带不透明的 next/prev 游标
+        :param keys: 排序键列，最后一列必须唯一，查询结果中要能按列名取到
+        :param cursor: 请求中的游标，空表示第一页
+        :param serialize: 把一页数据转换成响应中 items 的函数，默认 to_dict_batch
+        :raises ValueError: 游标格式不正确
+        """
+        items, next_cursor, prev_cursor = keyset_page(
+            query, keys, cursor, per_page, descending=descending)
+        return cls.cursor_dict(items, cursor, next_cursor, prev_cursor, per_page, endpoint,
+                               serialize=serialize, **kwargs)
+
+    @classmethod
+    def cursor_dict(cls, items, cursor, next_cursor, prev_cursor, per_page, endpoint,
+                    serialize=None, **kwargs):
+        """
+        由已取出的一页数据和前后页游标组装游标分页的响应
+        """
+        data = {
+            'items': (serialize or cls.to_dict_batch)(items),
+            '_meta': {
+                'per_page': per_page,
+                'cursor': cursor or None
+            },
+            '_links': {
+                'self': url_for(endpoint, cursor=cursor or '', per_page=per_page,
+                                **kwargs),
+                'next': url_for(endpoint, cursor=next_cursor, per_page=per_page,
+                                **kwargs) if next_cursor else None,
+                'prev': url_for(endpoint, cursor=prev_cursor, per_page=per_page,
+                                **kwargs) if prev_cursor else None
             }
         }
         return data
 
+    @classmethod
+    def _cached_count(cls, query):
+        """按 SQL 语句和参数缓存查询总数"""
+        statement = query.statement.compile()
+        key = (str(statement), repr(sorted(statement.params.items())))
+        now = time.monotonic()
+        cached = cls._count_cache.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        total = query.order_by(None).count()
+        if len(cls._count_cache) > 1024:
+            cls._count_cache.clear()
+        cls._count_cache[key] = (total, now + cls.COUNT_CACHE_TTL)
+        return total
+
 """
 Flask-SQLAlchemy提供了两种方式来定义模型。
 第一种是使用类来定义模型，第二种是使用db.Model的子类来定义模型。
@@ -43,17 +167,29 @@ Flask-Login提供了一个叫做UserMixin的mixin类来将它们归纳其中。
 
 followers = db.Table('followers',
     db.Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'))
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id')),
+    # 同一关系只能有一行；按关注者查询关注列表、按被关注者查询粉丝都走索引
+    db.Index('ix_followers_follower_id_followed_id', 'follower_id', 'followed_id', unique=True),
+    db.Index('ix_followers_followed_id_follower_id', 'followed_id', 'follower_id')
 )
 
 class User(UserMixin,db.Model, PaginatedAPIMixin):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, index=True)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     email = db.Column(db.String(64), unique=True, index=True)
+    # 邮箱的 md5 摘要，设置 email 时自动更新，生成头像 URL 时不必每次重新计算
+    email_hash = db.Column(db.String(32))
     about_me = db.Column(db.String(128))
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    # 冗余计数，由 follow/unfollow/add_post 在同一事务内维护，reconcile_counters 修复偏差
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    followed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # 行版本号和修改时间，API 用来生成 ETag
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     followed = db.relationship(
         'User', secondary=followers,
@@ -65,7 +201,8 @@ class User(UserMixin,db.Model, PaginatedAPIMixin):
         对用户输入的密码进行哈希处理并存储
         :param password: 用户输入的明文密码
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
+        self.forget_session_cache()
 
     def check_password(self, password):
         """
@@ -73,37 +210,167 @@ class User(UserMixin,db.Model, PaginatedAPIMixin):
         :param password: 用户输入的明文密码
         :return: 如果密码正确返回 True，否则返回 False
         """
-        return check_password_hash(self.password_hash, password)
+        if not hasher.verify(self.password_hash, password):
+            return False
+        # 哈希参数已过时则按当前配置重新计算，由调用方提交；只有哈希变了才让用户缓存失效
+        if hasher.needs_rehash(self.password_hash):
+            self.password_hash = hasher.hash(password)
+            self.forget_session_cache()
+        return True
     def avatar(self, size):
         """
         生成用户头像的URL
         :param size: 头像大小
         :return: 头像URL
         """
-        digest = md5(self.email.lower().encode('utf-8')).hexdigest()
-        return 'https://www.gravatar.com/avatar/{}?d=identicon&s={}'.format(digest, size)
+        digest = self.email_hash or email_digest(self.email)
+        return _gravatar_url(digest, size)
+
+    @validates('email')
+    def _update_email_hash(self, key, email):
+        self.email_hash = email_digest(email) if email else None
+        return email
     def follow(self, user):
         """
         关注用户
         :param user: 要关注的用户
         """
-        if not self.is_following(user):
+        if not self._follows_in_db(user):
             self.followed.append(user)
+            Timeline.backfill(self, user)
+            # 用 SQL 表达式自增，避免并发下读-改-写丢失更新
+            self.followed_count = User.followed_count + 1
+            user.follower_count = User.follower_count + 1
+            self.touch()
+            user.touch()
+            cache.invalidate_on_commit(db.session, 'users')
+            follow_graph.invalidate_on_commit(db.session, self.id, user.id)
     def unfollow(self, user):
         """
         取消关注用户
         :param user: 要取消关注的用户
         """
-        if self.is_following(user):
+        if self._follows_in_db(user):
             self.followed.remove(user)
+            self.followed_count = User.followed_count - 1
+            user.follower_count = User.follower_count - 1
+            self.touch()
+            user.touch()
+            cache.invalidate_on_commit(db.session, 'users')
+            follow_graph.invalidate_on_commit(db.session, self.id, user.id)
+            # 自己的文章始终在自己的时间线里，与 Timeline.backfill 一样跳过自己
+            if user.id != self.id:
+                Timeline.query.filter_by(owner_id=self.id, author_id=user.id).delete(
+                    synchronize_session=False)
+    def _follows_in_db(self, user):
+        """
+        在当前事务中直接查询 followers 表，供 follow/unfollow 判断，不使用可能过期的关注关系缓存
+        :param user: 要判断的用户
+        :return: 如果关注了返回 True，否则返回 False
+        """
+        return db.session.execute(db.select(followers.c.follower_id).where(
+            followers.c.follower_id == self.id,
+            followers.c.followed_id == user.id)).first() is not None
     def is_following(self, user):
         """
         判断是否关注了用户
         :param user: 要判断的用户
         :return: 如果关注了返回 True，否则返回 False
         """
-        return self.followed.filter(
-            followers.c.followed_id == user.id).count() > 0
+        return follow_graph.is_following(self.id, user.id)
+
+    def following_among(self, users):
+        """
+        一次判断是否关注了一组用户，用于列表中的关注按钮
+        :param users: 用户列表
+        :return: 其中已关注的用户 id 集合
+        """
+        return follow_graph.following_among(self.id, [user.id for user in users])
+
+    def mutual_follows(self):
+        """
+        互相关注的用户
+        :return: 按 id 排序的用户列表
+        """
+        return _users_in_order(follow_graph.mutuals(self.id))
+
+    def follow_suggestions(self, limit=None):
+        """
+        推荐关注：关注的人也关注了的用户，共同关注多的在前
+        :param limit: 最多返回的人数
+        :return: 用户列表
+        """
+        return _users_in_order([user_id for user_id, _ in follow_graph.suggestions(self.id, limit)])
+    def add_post(self, body):
+        """
+        发表文章。事务中只写文章和作者本人的时间线，
+        文章计数、粉丝时间线和全文索引在提交后由任务队列更新
+        :param body: 文章内容
+        :return: 新建的文章
+        """
+        post = Post(body=body, user_id=self.id)
+        db.session.add(post)
+        db.session.flush()
+        Timeline.add_own(post)
+        task_queue.enqueue('posts.fan_out', post.id)
+        task_queue.enqueue('posts.index', post.id)
+        # 缓存在 web 进程内，在本事务中失效；任务可能在另一个进程中执行
+        cache.invalidate_on_commit(db.session, 'posts', 'users')
+        return post
+
+    def followed_posts(self):
+        """
+        读时合并的时间线：关注用户和自己的文章，需要在读取时连接 followers 和 post
+        :return: 按时间倒序的文章查询
+        """
+        followed = Post.query.join(
+            followers, followers.c.followed_id == Post.user_id).filter(
+            followers.c.follower_id == self.id)
+        own = Post.query.filter_by(user_id=self.id)
+        return followed.union(own).order_by(Post.timestamp.desc())
+
+    def timeline(self):
+        """
+        读取物化的个人时间线。
+        正常情况下只在 timeline 表上按 (owner_id, timestamp, post_id) 做一次索引范围扫描；
+        粉丝数超过 FEED_FANOUT_LIMIT 的关注对象发文时不做写扩散，读取时再从 post 表拉取。
+        :return: (query, keys, key_func)，可直接交给 keyset_page 分页
+        """
+        limit = current_app.config.get('FEED_FANOUT_LIMIT', 1000)
+        pulled = [row[0] for row in db.session.query(followers.c.followed_id).join(
+            User, User.id == followers.c.followed_id).filter(
+            followers.c.follower_id == self.id, User.follower_count > limit)]
+        if not pulled:
+            query = Post.query.join(Timeline, Timeline.post_id == Post.id).filter(
+                Timeline.owner_id == self.id)
+            return query, (Timeline.timestamp, Timeline.post_id), _post_sort_key
+        materialized = db.select(Timeline.post_id).where(Timeline.owner_id == self.id)
+        query = Post.query.filter(db.or_(Post.id.in_(materialized), Post.user_id.in_(pulled)))
+        return query, (Post.timestamp, Post.id), _post_sort_key
+
+    @staticmethod
+    def reconcile_counters():
+        """
+        按 post 和 followers 表重新计算所有用户的冗余计数
+        :return: 被修正的用户数
+        """
+        post_count = db.select(db.func.count(Post.id)).where(
+            Post.user_id == User.id).scalar_subquery()
+        follower_count = db.select(db.func.count()).select_from(followers).where(
+            followers.c.followed_id == User.id).scalar_subquery()
+        followed_count = db.select(db.func.count()).select_from(followers).where(
+            followers.c.follower_id == User.id).scalar_subquery()
+        result = db.session.execute(
+            db.update(User).where(db.or_(
+                User.post_count != post_count,
+                User.follower_count != follower_count,
+                User.followed_count != followed_count))
+            .values(post_count=post_count,
+                    follower_count=follower_count,
+                    followed_count=followed_count)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        return result.rowcount
 
     def to_dict(self):
         data = {
@@ -112,9 +379,9 @@ class User(UserMixin,db.Model, PaginatedAPIMixin):
             'email': self.email,
             'about_me': self.about_me,
             'last_seen': self.last_seen,
-            'post_count': self.posts.count(),
-            'follower_count': self.followers.count(),
-            'followed_count': self.followed.count(),
+            'post_count': self.post_count,
+            'follower_count': self.follower_count,
+            'followed_count': self.followed_count,
             '_links': {
                 'self': url_for('api.get_user', id=self.id),
                 'avatar': self.avatar(128)
@@ -128,19 +395,220 @@ class User(UserMixin,db.Model, PaginatedAPIMixin):
                 setattr(self, field, data[field])
         if new_user and 'password' in data:
             self.set_password(data['password'])
+        self.touch()
+        self.forget_session_cache()
+        if self.id is not None:
+            cache.invalidate_on_commit(db.session, 'users')
     def save(self):
+        self.touch()
         db.session.add(self)
+        self.forget_session_cache()
+        cache.invalidate_on_commit(db.session, 'users')
         db.session.commit()
+    def forget_session_cache(self, session=None):
+        """
+        提交后让登录用户缓存中的该用户失效，新建的用户还没有缓存条目
+        :param session: 所在的数据库会话，默认 db.session
+        """
+        if self.id is not None:
+            user_cache.invalidate_on_commit(session or db.session, self.id)
+    def touch(self):
+        """
+        递增版本号并记录修改时间，同一次提交内多次调用只递增一次
+        """
+        self.version = User.version + 1 if self.id is not None else 1
+        self.updated_at = datetime.utcnow()
     def __repr__(self):
         return '<User %r>' % self.username
 
-class Post(db.Model):
+class Post(db.Model, PaginatedAPIMixin):
     __tablename__ = 'post'
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        # 个人主页按作者取最新文章
+        db.Index('ix_post_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'body': self.body,
+            'timestamp': self.timestamp,
+            'author_id': self.user_id,
+            '_links': {
+                'author': url_for('api.get_user', id=self.user_id)
+            }
+        }
+        return data
 
+    @staticmethod
+    def load_authors(posts):
+        """
+        为一页文章批量填充 author，避免模板中逐篇触发懒加载。
+        作者依次从本次请求的作者缓存、会话身份映射中查找，
+        都没有的再用一条 IN 查询取回
+        :param posts: 文章列表
+        :return: 原文章列表
+        """
+        authors = g.setdefault('_post_authors', {})
+        missing = set()
+        for user_id in {post.user_id for post in posts if post.user_id is not None}:
+            if user_id in authors:
+                continue
+            user = db.session.identity_map.get(db.session.identity_key(User, user_id))
+            if user is None:
+                missing.add(user_id)
+            else:
+                authors[user_id] = user
+        if missing:
+            for user in User.query.filter(User.id.in_(missing)):
+                authors[user.id] = user
+        for post in posts:
+            if post.user_id in authors:
+                set_committed_value(post, 'author', authors[post.user_id])
+        return posts
 
     def __repr__(self):
         return '<Post {}>'.format(self.body)
+
+
+def _post_sort_key(post):
+    return [post.timestamp, post.id]
+
+
+def _users_in_order(user_ids):
+    # 一次查询取回用户，并保持 user_ids 的顺序
+    if not user_ids:
+        return []
+    found = {user.id: user for user in User.query.filter(User.id.in_(user_ids))}
+    return [found[user_id] for user_id in user_ids if user_id in found]
+
+
+class Timeline(db.Model):
+    """
+    物化的个人时间线（写扩散）。
+    发文时为作者本人和每个粉丝各写一行，读取个人时间线只需按 owner_id 做索引范围扫描。
+    """
+    __tablename__ = 'timeline'
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (
+        db.Index('ix_timeline_owner_author', 'owner_id', 'author_id'),
+    )
+
+    @staticmethod
+    def add_own(post):
+        """
+        把新文章写入作者本人的时间线
+        :param post: 已 flush 的文章
+        """
+        db.session.add(Timeline(owner_id=post.user_id, timestamp=post.timestamp,
+                                post_id=post.id, author_id=post.user_id))
+
+    @staticmethod
+    def fan_out(post, follower_count):
+        """
+        把文章写入粉丝的时间线
+        :param post: 已提交的文章
+        :param follower_count: 作者的粉丝数，超过 FEED_FANOUT_LIMIT 时不写扩散
+        """
+        if follower_count > current_app.config.get('FEED_FANOUT_LIMIT', 1000):
+            return
+        fans = db.select(
+            followers.c.follower_id, db.literal(post.timestamp), db.literal(post.id),
+            db.literal(post.user_id)
+        ).where(
+            followers.c.followed_id == post.user_id,
+            followers.c.follower_id != post.user_id
+        ).distinct()
+        db.session.execute(db.insert(Timeline).from_select(
+            ['owner_id', 'timestamp', 'post_id', 'author_id'], fans))
+
+    @staticmethod
+    def backfill(owner, author):
+        """
+        关注后把被关注者最近的 FEED_BACKFILL 篇文章补进关注者的时间线
+        """
+        if author.id == owner.id or \
+                author.follower_count > current_app.config.get('FEED_FANOUT_LIMIT', 1000):
+            return
+        recent = db.select(
+            db.literal(owner.id), Post.timestamp, Post.id, Post.user_id
+        ).where(
+            Post.user_id == author.id, Post.timestamp.isnot(None)
+        ).order_by(Post.timestamp.desc()).limit(current_app.config.get('FEED_BACKFILL', 100))
+        db.session.execute(db.insert(Timeline).from_select(
+            ['owner_id', 'timestamp', 'post_id', 'author_id'], recent))
+
+
+class RevokedToken(db.Model):
+    """
+    已吊销的 JWT。各进程把它同步到内存中的集合里，校验令牌时不查数据库；
+    revoked_at 用作增量同步的水位线，过期的记录可以用 purge-revoked-tokens 命令清理
+    """
+    __tablename__ = 'revoked_token'
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    token_type = db.Column(db.String(10))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    expires_at = db.Column(db.DateTime, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class Task(db.Model):
+    """
+    数据库后端的任务队列，见 app/tasks.py。
+    任务执行成功后删除；failed_at 不为空的是重试次数用尽的任务，保留供排查
+    """
+    __tablename__ = 'task'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    enqueued_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    failed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    __table_args__ = (
+        # 取任务时按 failed_at IS NULL、run_at 到期的顺序扫描
+        db.Index('ix_task_failed_at_run_at', 'failed_at', 'run_at'),
+    )
+
+    def __repr__(self):
+        return '<Task {} {}>'.format(self.id, self.name)
+
+
+@task_queue.task('posts.fan_out')
+def _fan_out_post(post_id):
+    """
+    发文的后续写入：作者的文章计数和粉丝的时间线。
+    文章计数按 post 表重新统计而不是加一，任务重试或重复执行不会多计；
+    缓存已在发文的事务中失效，这里的失效只对同一进程内的 worker 有效
+    """
+    post = db.session.get(Post, post_id)
+    if post is None:
+        return
+    post_count = db.select(db.func.count(Post.id)).where(
+        Post.user_id == post.user_id).scalar_subquery()
+    db.session.execute(
+        db.update(User).where(User.id == post.user_id)
+        .values(post_count=post_count, version=User.version + 1,
+                updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False))
+    author = db.session.get(User, post.user_id)
+    Timeline.fan_out(post, author.follower_count)
+    cache.invalidate_on_commit(db.session, 'users')
+
+
+@task_queue.task('posts.index')
+def _index_post(post_id):
+    """写入全文索引，重复执行结果相同；索引写失败时抛出异常由队列重试"""
+    post = db.session.get(Post, post_id)
+    if post is not None:
+        search_index.add([(post.id, post.body)])
@@ -0,0 +1,181 @@
+"""
+键集（游标）分页。
+按排序键定位上一页的边界行，用 WHERE (k1, k2) < (v1, v2) 直接在索引上查找，
+翻页代价与页码深度无关，新插入的行也不会造成重复或遗漏。
+游标对客户端是不透明的字符串，编码了翻页方向和边界行的排序键值。
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import DateTime, and_, or_
+
+
+def encode_cursor(direction, values):
+    """
+    编码游标
+    :param direction: 'n' 表示向后翻页，'p' 表示向前翻页
+    :param values: 边界行的排序键值
+    :return: URL 安全的游标字符串
+    """
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps([direction] + values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor, keys):
+    """
+    解码游标
+    :param cursor: encode_cursor 生成的字符串
+    :param keys: 排序键列，用于还原键值类型
+    :return: (direction, values)
+    :raises ValueError: 游标格式不正确
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+    # 游标来自客户端，只接受 [方向, 标量键值...] 形式的列表
+    if not isinstance(data, list) or not data:
+        raise ValueError('invalid cursor')
+    direction, values = data[0], data[1:]
+    if direction not in ('n', 'p') or len(values) != len(keys) or \
+            not all(_is_scalar(v) for v in values):
+        raise ValueError('invalid cursor')
+    try:
+        values = [datetime.fromisoformat(v) if isinstance(key.type, DateTime) else v
+                  for key, v in zip(keys, values)]
+    except (TypeError, ValueError):
+        raise ValueError('invalid cursor')
+    return direction, values
+
+
+def _is_scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def _seek(keys, values, descending):
+    # 展开为 k1 < v1 OR (k1 = v1 AND k2 < v2) ...，保证各数据库都能走索引
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        bound = key < value if descending else key > value
+        clauses.append(and_(*[k == v for k, v in zip(keys[:i], values[:i])], bound))
+    return or_(*clauses)
+
+
+def keyset_page(query, keys, cursor, per_page, descending=True, key_func=None):
+    """
+    按排序键取一页数据
+    :param query: 未排序的查询
+    :param keys: 排序键列，最后一列必须唯一（通常是主键）
+    :param cursor: 游标字符串，None 或空字符串表示第一页
+    :param per_page: 每页条数
+    :param descending: 是否降序
+    :param key_func: 从结果行取排序键值的函数，默认按列名取属性
+    :return: (items, next_cursor, prev_cursor)
+    :raises ValueError: 游标格式不正确
+    """
+    query, state = keyset_query(query, keys, cursor, per_page, descending)
+    return keyset_result(query.all(), keys, per_page, state, key_func)
+
+
+def keyset_query(query, keys, cursor, per_page, descending=True):
+    """
+    keyset_page 的前半部分：给查询加上定位条件、排序和 LIMIT，
+    ORM 查询和 select() 语句都可以，异步会话执行语句后再交给 keyset_result
+    :return: (查询, 翻页状态)
+    :raises ValueError: 游标格式不正确
+    """
+    direction, values = decode_cursor(cursor, keys) if cursor else ('n', None)
+    # 向前翻页时反向排序查询，取回后再倒序
+    reverse = direction == 'p'
+    order_desc = descending != reverse
+    if values is not None:
+        query = query.filter(_seek(keys, values, order_desc))
+    order = [key.desc() if order_desc else key.asc() for key in keys]
+    return query.order_by(*order).limit(per_page + 1), (reverse, values is not None)
+
+
+def keyset_result(rows, keys, per_page, state, key_func=None):
+    """
+    keyset_page 的后半部分：由多取一行的结果算出本页数据和前后页游标
+    :param rows: keyset_query 返回的查询的结果
+    :param state: keyset_query 返回的翻页状态
+    :return: (items, next_cursor, prev_cursor)
+    """
+    if key_func is None:
+        def key_func(item):
+            return [getattr(item, key.key) for key in keys]
+    reverse, seeking = state
+    has_more = len(rows) > per_page
+    items = list(rows[:per_page])
+    if reverse:
+        items.reverse()
+    if not items:
+        return items, None, None
+    next_cursor, prev_cursor = _page_cursors(
+        key_func(items[0]), key_func(items[-1]), has_more, reverse, seeking)
+    return items, next_cursor, prev_cursor
+
+
+def _page_cursors(first, last, has_more, reverse, seeking):
+    # 由本页首尾两行的排序键算出前后页游标
+    if reverse:
+        return encode_cursor('n', last), encode_cursor('p', first) if has_more else None
+    return encode_cursor('n', last) if has_more else None, \
+        encode_cursor('p', first) if seeking else None
+
+
+class KeysetPage(object):
+    """
+    延迟执行的键集分页，适合流式渲染：模板遍历时才执行查询并逐行产出，
+    遍历结束后 next_cursor / prev_cursor 才可用，模板应在循环之后再生成翻页链接。
+    向后翻页时按查询顺序直接产出，不缓存整页；向前翻页需要倒序，先取回本页再产出
+    """
+
+    def __init__(self, query, keys, cursor, per_page, descending=True, key_func=None,
+                 on_item=None):
+        """
+        参数同 keyset_page
+        :param on_item: 产出每一行之前调用的函数，例如为文章设置已加载的作者
+        :raises ValueError: 游标格式不正确
+        """
+        self._query, self._state = keyset_query(query, keys, cursor, per_page, descending)
+        self.keys = keys
+        self.per_page = per_page
+        self.key_func = key_func or (lambda item: [getattr(item, key.key) for key in keys])
+        self.on_item = on_item
+        self.next_cursor = None
+        self.prev_cursor = None
+        self._done = False
+
+    def __iter__(self):
+        if self._done:
+            raise RuntimeError('a KeysetPage can only be iterated once')
+        self._done = True
+        reverse, seeking = self._state
+        if reverse:
+            rows = self._query.all()
+        else:
+            rows = self._query
+        first = last = None
+        count = 0
+        has_more = False
+        for item in (reversed(rows[:self.per_page]) if reverse else rows):
+            if count == self.per_page:
+                # 多取的一行只用来判断是否还有下一页
+                has_more = True
+                break
+            if self.on_item is not None:
+                self.on_item(item)
+            if first is None:
+                first = item
+            last = item
+            count += 1
+            yield item
+        if reverse:
+            has_more = len(rows) > self.per_page
+        if first is not None:
+            self.next_cursor, self.prev_cursor = _page_cursors(
+                self.key_func(first), self.key_func(last), has_more, reverse, seeking)
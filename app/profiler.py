@@ -0,0 +1,191 @@
+"""
+请求级 SQL 性能分析。
+SQL_PROFILER_ENABLED 打开后，通过 SQLAlchemy 引擎事件和 Flask 请求/模板信号记录每个请求的
+SQL 条数、数据库耗时、重复语句（疑似 N+1 循环）和模板渲染耗时，按端点汇总成分位数，
+在 /admin/profile 查看，或在进程退出时写入日志。关闭时不注册任何钩子，没有额外开销。
+"""
+import atexit
+import json
+import threading
+import time
+from collections import Counter, deque
+
+from flask import before_render_template, g, has_app_context, request, \
+    request_started, request_tearing_down, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestProfile(object):
+    """单个请求的统计"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.render_start = 0.0
+
+
+class EndpointStats(object):
+    """单个端点最近 samples 个请求的统计"""
+
+    def __init__(self, samples):
+        self.requests = 0
+        self.samples = deque(maxlen=samples)
+        self.duplicates = Counter()
+
+    def add(self, duration, profile, duplicates):
+        self.requests += 1
+        self.samples.append((duration, profile.queries, profile.db_time, profile.render_time))
+        self.duplicates.update(duplicates.keys())
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pick(q):
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': values[-1]}
+
+
+class QueryProfiler(object):
+    """
+    配置项：
+    SQL_PROFILER_ENABLED: 是否开启
+    SQL_PROFILER_SAMPLES: 每个端点保留的最近请求数
+    SQL_PROFILER_DUPLICATE_THRESHOLD: 同一语句在一个请求内执行达到该次数即视为重复
+    SQL_PROFILER_SLOW_MS: 超过该耗时的请求写一条警告日志，0 表示不记录
+    SQL_PROFILER_DUMP_ON_EXIT: 进程退出时把报告写入日志
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._stats = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['profiler'] = self
+        if not app.config.get('SQL_PROFILER_ENABLED', False):
+            return
+        self.app = app
+        self.enabled = True
+        self.samples = app.config.get('SQL_PROFILER_SAMPLES', 1000)
+        self.duplicate_threshold = app.config.get('SQL_PROFILER_DUPLICATE_THRESHOLD', 3)
+        self.slow_ms = app.config.get('SQL_PROFILER_SLOW_MS', 0)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        request_started.connect(self._request_started, app)
+        # 在请求上下文弹出时汇总而不是 after_request：stream_with_context 的流式响应
+        # （如导出、大列表）在生成响应体时才查询，上下文要到响应关闭时才弹出
+        request_tearing_down.connect(self._request_teardown, app)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        if app.config.get('SQL_PROFILER_DUMP_ON_EXIT', False):
+            atexit.register(self._dump)
+
+    def _request_started(self, sender, **extra):
+        g._sql_profile = RequestProfile()
+
+    def _before_render(self, sender, **extra):
+        profile = g.get('_sql_profile')
+        if profile is not None:
+            if profile.render_depth == 0:
+                profile.render_start = time.perf_counter()
+            profile.render_depth += 1
+
+    def _after_render(self, sender, **extra):
+        profile = g.get('_sql_profile')
+        if profile is not None and profile.render_depth:
+            profile.render_depth -= 1
+            if profile.render_depth == 0:
+                profile.render_time += time.perf_counter() - profile.render_start
+
+    def _request_teardown(self, sender, **extra):
+        profile = g.pop('_sql_profile', None)
+        if profile is None:
+            return
+        duration = time.perf_counter() - profile.start
+        endpoint = request.endpoint or request.path
+        duplicates = {stmt: n for stmt, n in profile.statements.items()
+                      if n >= self.duplicate_threshold}
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats(self.samples)
+            stats.add(duration, profile, duplicates)
+        if self.slow_ms and duration * 1000 >= self.slow_ms:
+            sender.logger.warning(
+                'slow request %s %.1fms queries=%d db=%.1fms render=%.1fms duplicates=%d',
+                endpoint, duration * 1000, profile.queries, profile.db_time * 1000,
+                profile.render_time * 1000, len(duplicates))
+
+    def report(self):
+        """
+        按端点汇总的报告，按 p95 耗时从慢到快排序
+        :return: 列表，每项是一个端点的统计
+        """
+        with self._lock:
+            items = [(endpoint, stats.requests, list(stats.samples), stats.duplicates.most_common(5))
+                     for endpoint, stats in self._stats.items()]
+        result = []
+        for endpoint, requests, samples, duplicates in items:
+            columns = list(zip(*samples))
+
+            def ms(values):
+                return {k: round(v * 1000, 3) for k, v in _percentiles(values).items()}
+            result.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'duration_ms': ms(columns[0]),
+                'queries': _percentiles(columns[1]),
+                'db_time_ms': ms(columns[2]),
+                'render_ms': ms(columns[3]),
+                'duplicate_statements': [{'statement': stmt, 'requests': n}
+                                         for stmt, n in duplicates],
+            })
+        result.sort(key=lambda item: item['duration_ms'].get('p95', 0), reverse=True)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def _dump(self):
+        report = self.report()
+        if report:
+            self.app.logger.info('sql profile report: %s', json.dumps(report, ensure_ascii=False))
+
+
+def _current_profile():
+    if not has_app_context():
+        return None
+    return g.get('_sql_profile')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    if profile is not None:
+        conn.info.setdefault('_profile_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    if profile is None:
+        return
+    starts = conn.info.get('_profile_start')
+    if starts:
+        profile.db_time += time.perf_counter() - starts.pop()
+    profile.queries += 1
+    profile.statements[statement] += 1
+
+
+profiler = QueryProfiler()
@@ -0,0 +1,221 @@
+"""
+请求限流。
+登录、注册等接口每次请求都要计算密码哈希，撞库时大量请求会直接变成哈希计算和数据库查询。
+这里按客户端 IP 限制请求速率，超过时在进入视图之前返回 429 和 Retry-After。
+
+限流算法为 GCRA（通用信元速率算法，等价于令牌桶）：每个键只保存一个"理论到达时间"，
+每次检查 O(1)，允许在一个周期内突发 limit 个请求，之后按 period / limit 的间隔匀速放行。
+理论到达时间早于当前时间的键与不存在等价，可以随时淘汰。
+
+两种后端：
+- 'memory'：进程内有界 LRU，多个 worker 进程各自计数；
+- 'sqlite'：本机 SQLite 文件（RATELIMIT_STORAGE_PATH），同一台机器上的 worker 进程共享计数。
+
+规则在 RATELIMIT_RULES 中按端点或蓝图配置，键前面可以加 HTTP 方法，
+查找顺序为 '方法 端点'、'端点'、'方法 蓝图'、'蓝图'，使用第一个匹配的规则：
+
+    RATELIMIT_RULES = {
+        'POST auth.login': '10/minute;50/hour',
+        'api': '600/minute',
+    }
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$')
+
+
+class RateLimitExceeded(Exception):
+    """请求超过限流规则"""
+
+    def __init__(self, retry_after):
+        super(RateLimitExceeded, self).__init__('rate limit exceeded')
+        self.retry_after = retry_after
+
+
+def parse_limits(text):
+    """
+    解析限流规则
+    :param text: 如 '10/minute;50/hour'，也可以写成 '5/10second'
+    :return: [(次数, 周期秒数)]
+    :raises ValueError: 格式不正确
+    """
+    limits = []
+    for part in text.split(';'):
+        match = _LIMIT_RE.match(part)
+        if match is None or int(match.group(1)) <= 0:
+            raise ValueError('invalid rate limit {!r}'.format(part))
+        count, multiple, unit = match.groups()
+        limits.append((int(count), int(multiple or 1) * _PERIODS[unit]))
+    return limits
+
+
+def _gcra(tat, now, count, period):
+    """
+    :param tat: 键当前的理论到达时间，不存在时为 None
+    :return: (检查后的理论到达时间, 需等待的秒数)，放行时等待秒数为 0
+    """
+    tat = max(tat or now, now)
+    new_tat = tat + period / count
+    # 留一点余量，避免 period / count 的舍入误差使第 count 个请求被拒绝
+    if new_tat - now > period + 1e-6:
+        return tat, new_tat - period - now
+    return new_tat, 0
+
+
+class MemoryBackend(object):
+    """进程内限流状态，超过 max_keys 时淘汰最久未访问的键"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, items, now):
+        """
+        按所有规则检查一次请求，全部放行时才记账
+        :param items: [(键, 次数, 周期秒数)]
+        :return: 需等待的秒数，0 表示放行
+        """
+        with self._lock:
+            updates, wait = [], 0
+            for key, count, period in items:
+                tat, retry_after = _gcra(self._data.get(key), now, count, period)
+                updates.append((key, tat))
+                wait = max(wait, retry_after)
+            if wait:
+                return wait
+            for key, tat in updates:
+                self._data[key] = tat
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteBackend(object):
+    """
+    本机 SQLite 文件中的限流状态，每个键一行，检查和更新在一个写事务中完成。
+    每隔 purge_every 次写入删除一次已经空闲的键
+    """
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+
+    def _connect(self):
+        # 每个线程一个连接；fork 出的子进程不能沿用父进程的连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('CREATE TABLE IF NOT EXISTS ratelimit '
+                     '(key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def acquire(self, items, now):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            updates, wait = [], 0
+            for key, count, period in items:
+                row = conn.execute('SELECT tat FROM ratelimit WHERE key = ?', (key,)).fetchone()
+                tat, retry_after = _gcra(row[0] if row else None, now, count, period)
+                updates.append((key, tat))
+                wait = max(wait, retry_after)
+            if not wait:
+                conn.executemany('INSERT OR REPLACE INTO ratelimit (key, tat) VALUES (?, ?)',
+                                 updates)
+                self._writes += 1
+                if self._writes % self.purge_every == 0:
+                    conn.execute('DELETE FROM ratelimit WHERE tat < ?', (now,))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return wait
+
+    def clear(self):
+        self._connect().execute('DELETE FROM ratelimit')
+
+
+class RateLimiter(object):
+    """
+    配置项：
+    RATELIMIT_ENABLED: 是否启用限流
+    RATELIMIT_BACKEND: 'memory' 或 'sqlite'
+    RATELIMIT_STORAGE_PATH: sqlite 后端的文件路径
+    RATELIMIT_MAX_KEYS: memory 后端最多保存的键数
+    RATELIMIT_RULES: {'[方法 ]端点或蓝图': '次数/周期[;次数/周期]'}
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.backend = None
+        self.rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        self.rules = {name: parse_limits(text)
+                      for name, text in app.config.get('RATELIMIT_RULES', {}).items()}
+        if app.config.get('RATELIMIT_BACKEND', 'memory') == 'sqlite':
+            self.backend = SQLiteBackend(app.config['RATELIMIT_STORAGE_PATH'])
+        else:
+            self.backend = MemoryBackend(app.config.get('RATELIMIT_MAX_KEYS', 100000))
+        app.extensions['ratelimit'] = self
+        app.before_request(self.check)
+
+    def rule_for(self, endpoint, blueprint, method):
+        """
+        :return: (规则名, [(次数, 周期秒数)])，没有匹配的规则时返回 (None, None)
+        """
+        for name in ('{} {}'.format(method, endpoint), endpoint,
+                     '{} {}'.format(method, blueprint), blueprint):
+            limits = self.rules.get(name)
+            if limits is not None:
+                return name, limits
+        return None, None
+
+    def hit(self, name, limits, client, now=None):
+        """
+        记一次请求
+        :param name: 规则名，不同规则分别计数
+        :param client: 客户端标识
+        :return: 需等待的秒数，0 表示放行
+        """
+        now = time.time() if now is None else now
+        key = '{}|{}'.format(name, client)
+        items = [('{}|{}'.format(key, period), count, period) for count, period in limits]
+        return self.backend.acquire(items, now)
+
+    def check(self):
+        """before_request 钩子，超过限流时抛出 RateLimitExceeded"""
+        if not self.enabled or request.endpoint is None:
+            return
+        name, limits = self.rule_for(request.endpoint, request.blueprint, request.method)
+        if limits is None:
+            return
+        wait = self.hit(name, limits, request.remote_addr or '-')
+        if wait:
+            raise RateLimitExceeded(max(1, int(wait + 0.999)))
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,146 @@
+"""
+JWT 吊销列表。
+已吊销令牌的 jti 保存在 revoked_token 表中，每个进程在内存里保留一份 {jti: 过期时间}，
+校验令牌时只做一次字典查找，不访问数据库。
+内存副本按 JWT_REVOCATION_SYNC_INTERVAL 从表中增量同步，本进程吊销的令牌立即生效，
+其他进程最迟在一个同步间隔后生效。
+
+增量同步按 revoked_at 取新行，并向前多取 JWT_REVOCATION_SYNC_OVERLAP 秒：
+自增 id 按分配顺序而不是提交顺序可见，按 id 做水位线会漏掉提交较晚的小 id；
+revoked_at 由各进程的时钟生成，重叠窗口覆盖提交延迟和时钟误差。
+另外每隔 JWT_REVOCATION_RELOAD_INTERVAL 整体重新加载一次未过期的 jti，作为兜底。
+"""
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy.exc import IntegrityError
+
+from app.models import db, RevokedToken
+
+
+class RevocationList(object):
+    """
+    配置项：
+    JWT_REVOCATION_SYNC_INTERVAL: 从数据库同步的间隔（秒），<= 0 时每次校验都同步
+    JWT_REVOCATION_SYNC_OVERLAP: 增量同步向前重叠的秒数
+    JWT_REVOCATION_RELOAD_INTERVAL: 整体重新加载的间隔（秒）
+    """
+
+    def __init__(self, app=None, jwt=None):
+        self.interval = 30
+        self.overlap = timedelta(seconds=300)
+        self.reload_interval = 600
+        self._revoked = {}
+        self._watermark = None
+        self._synced_at = None
+        self._reloaded_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, jwt)
+
+    def init_app(self, app, jwt):
+        """
+        :param jwt: JWTManager 实例，在它上面注册吊销检查回调
+        """
+        self.interval = app.config.get('JWT_REVOCATION_SYNC_INTERVAL', 30)
+        self.overlap = timedelta(seconds=app.config.get('JWT_REVOCATION_SYNC_OVERLAP', 300))
+        self.reload_interval = app.config.get('JWT_REVOCATION_RELOAD_INTERVAL', 600)
+        app.extensions['revocation_list'] = self
+
+        @jwt.token_in_blocklist_loader
+        def check_if_token_revoked(jwt_header, jwt_payload):
+            return self.is_revoked(jwt_payload)
+
+    def is_revoked(self, payload):
+        """
+        令牌是否已被吊销
+        :param payload: 解码后的 JWT 载荷
+        """
+        now = time.time()
+        if self._synced_at is None or now - self._synced_at >= self.interval:
+            self.sync()
+        return payload['jti'] in self._revoked
+
+    def revoke(self, payload):
+        """
+        吊销令牌并提交
+        :param payload: 解码后的 JWT 载荷
+        """
+        jti = payload['jti']
+        if jti in self._revoked:
+            return
+        # 其他进程可能已经吊销过，只是还没有同步到本进程
+        if not db.session.query(RevokedToken.query.filter_by(jti=jti).exists()).scalar():
+            db.session.add(RevokedToken(
+                jti=jti, token_type=payload.get('type'),
+                user_id=int(payload['sub']) if payload.get('sub') else None,
+                expires_at=_from_timestamp(payload['exp']) if payload.get('exp') else None))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # 并发的请求刚吊销了同一个令牌
+                db.session.rollback()
+        self._revoked[jti] = payload.get('exp')
+
+    def sync(self):
+        """
+        从数据库取上次同步之后新增的吊销记录，并丢弃已经过期的条目；
+        距上次整体加载超过 JWT_REVOCATION_RELOAD_INTERVAL 时改为整体加载。
+        同一时间只有一个线程同步，其他线程直接使用当前的内存副本
+        :return: 读到的记录数
+        """
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.time()
+            reload = self._reloaded_at is None or now - self._reloaded_at >= self.reload_interval
+            query = db.session.query(RevokedToken.jti, RevokedToken.expires_at,
+                                     RevokedToken.revoked_at)
+            if reload:
+                rows = query.filter(db.or_(
+                    RevokedToken.expires_at.is_(None),
+                    RevokedToken.expires_at > _from_timestamp(now))).all()
+                revoked = {}
+            else:
+                if self._watermark is not None:
+                    # revoked_at 为空的旧记录只在整体加载时读取
+                    query = query.filter(RevokedToken.revoked_at >= self._watermark - self.overlap)
+                rows = query.all()
+                revoked = {jti: exp for jti, exp in self._revoked.items()
+                           if exp is None or exp > now}
+            for row in rows:
+                exp = row.expires_at.replace(tzinfo=UTC).timestamp() if row.expires_at else None
+                if exp is None or exp > now:
+                    revoked[row.jti] = exp
+                if row.revoked_at is not None and \
+                        (self._watermark is None or row.revoked_at > self._watermark):
+                    self._watermark = row.revoked_at
+            # 整体替换，读取方不需要加锁
+            self._revoked = revoked
+            self._synced_at = now
+            if reload:
+                self._reloaded_at = now
+            return len(rows)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def purge():
+        """
+        删除已过期的吊销记录，过期的令牌本身就无法通过校验
+        :return: 删除的行数
+        """
+        count = RevokedToken.query.filter(
+            RevokedToken.expires_at < datetime.now(UTC).replace(tzinfo=None)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+
+def _from_timestamp(value):
+    # 数据库中统一保存不带时区的 UTC 时间
+    return datetime.fromtimestamp(value, UTC).replace(tzinfo=None)
+
+
+revocation_list = RevocationList()
@@ -0,0 +1,199 @@
+"""
+文章全文搜索。
+倒排索引放在本地 SQLite 文件的 FTS5 虚表中（SEARCH_INDEX_PATH），与主库无关，主库是 MySQL 时同样可用。
+中文没有空格分词，入库和查询前先把连续的中日韩字符切成重叠的二字组（bigram），
+其他文字按单词转小写，再交给 FTS5 的 unicode61 分词器按空格切分。
+结果按 bm25 相关度排序，用 (score, post_id) 做键集分页。
+发文后由任务队列的 posts.index 任务增量写入索引，flask reindex-posts 从 post 表重建整个索引。
+"""
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import Float, Integer, column
+
+from app.pagination import decode_cursor, encode_cursor
+
+# 中日韩字符连续成段，其他字母数字按单词切分
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN_RE = re.compile('[{0}]+|[^\\W_{0}]+'.format(_CJK))
+_CJK_RE = re.compile('[{}]'.format(_CJK))
+# 游标中键值的类型，用于 decode_cursor 还原
+_CURSOR_KEYS = (column('score', Float), column('post_id', Integer))
+
+
+def tokenize(text):
+    """
+    切分文本
+    :param text: 原文
+    :return: 词元列表，中日韩文字为重叠的二字组，单个字保留原样
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text or ''):
+        word = match.group()
+        if _is_cjk(word[0]):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def _is_cjk(char):
+    return _CJK_RE.match(char) is not None
+
+
+def match_expression(query):
+    """
+    把用户输入转换成 FTS5 查询，所有词元都要出现（AND）。
+    单个中文字按前缀匹配，能命中以它开头的二字组
+    :return: 查询表达式，没有可搜索的词元时返回 None
+    """
+    terms = []
+    for token in tokenize(query):
+        term = '"{}"'.format(token)
+        if len(token) == 1 and _is_cjk(token):
+            term += '*'
+        terms.append(term)
+    return ' '.join(terms) or None
+
+
+class SearchIndex(object):
+    """
+    配置项：
+    SEARCH_INDEX_PATH: 索引文件路径
+    SEARCH_REINDEX_BATCH_SIZE: 重建索引时每批从 post 表读取的行数
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.batch_size = 1000
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config['SEARCH_INDEX_PATH']
+        self.batch_size = app.config.get('SEARCH_REINDEX_BATCH_SIZE', 1000)
+        app.extensions['search'] = self
+
+    def _connect(self):
+        # 每个线程一个连接；fork 出的子进程不能沿用父进程的连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+                     "tokens, tokenize='unicode61 remove_diacritics 2')")
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def add(self, posts):
+        """
+        写入或更新文章的索引
+        :param posts: [(post_id, body)]
+        """
+        if not posts:
+            return
+        conn = self._connect()
+        # FTS5 不保证对 rowid 执行 REPLACE，先删除旧行再插入，重复执行（如任务重试）结果相同
+        with _transaction(conn):
+            conn.executemany('DELETE FROM post_fts WHERE rowid = ?',
+                             [(post_id,) for post_id, body in posts])
+            conn.executemany('INSERT INTO post_fts(rowid, tokens) VALUES (?, ?)',
+                             [(post_id, ' '.join(tokenize(body))) for post_id, body in posts])
+
+    def remove(self, post_ids):
+        """从索引中删除文章"""
+        conn = self._connect()
+        with _transaction(conn):
+            conn.executemany('DELETE FROM post_fts WHERE rowid = ?',
+                             [(post_id,) for post_id in post_ids])
+
+    def search(self, query, cursor=None, per_page=10):
+        """
+        按相关度搜索文章
+        :param query: 用户输入的查询
+        :param cursor: 上一页返回的游标
+        :return: (post_ids, next_cursor)
+        :raises ValueError: 游标格式不正确
+        """
+        expression = match_expression(query)
+        if expression is None:
+            return [], None
+        sql = ('SELECT post_id, score FROM (SELECT rowid AS post_id, bm25(post_fts) AS score '
+               'FROM post_fts WHERE post_fts MATCH ?)')
+        params = [expression]
+        if cursor:
+            direction, (score, post_id) = decode_cursor(cursor, _CURSOR_KEYS)
+            if direction != 'n':
+                raise ValueError('invalid cursor')
+            # bm25 越小越相关，同分时按 id 排序保证翻页稳定
+            sql += ' WHERE score > ? OR (score = ? AND post_id > ?)'
+            params += [score, score, post_id]
+        sql += ' ORDER BY score, post_id LIMIT ?'
+        params.append(per_page + 1)
+        try:
+            rows = self._connect().execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            # 用户输入导致 FTS5 语法错误时当作没有结果
+            return [], None
+        next_cursor = None
+        if len(rows) > per_page:
+            post_id, score = rows[per_page - 1]
+            next_cursor = encode_cursor('n', [score, post_id])
+        return [row[0] for row in rows[:per_page]], next_cursor
+
+    def search_posts(self, query, cursor=None, per_page=10):
+        """
+        搜索并按相关度顺序取回文章，作者已批量加载
+        :return: (posts, next_cursor)
+        :raises ValueError: 游标格式不正确
+        """
+        from app.models import Post
+        post_ids, next_cursor = self.search(query, cursor, per_page)
+        if not post_ids:
+            return [], next_cursor
+        found = {post.id: post for post in Post.query.filter(Post.id.in_(post_ids))}
+        # 索引中可能还留有主库已删除的文章，跳过即可
+        posts = [found[post_id] for post_id in post_ids if post_id in found]
+        return Post.load_authors(posts), next_cursor
+
+    def rebuild(self):
+        """
+        从 post 表重建索引，在一个事务中完成，重建期间的查询看到的仍是旧索引
+        :return: 写入索引的文章数
+        """
+        from app.models import db, Post
+        conn = self._connect()
+        count = 0
+        result = db.session.execute(
+            db.select(Post.id, Post.body).execution_options(yield_per=self.batch_size))
+        with _transaction(conn):
+            conn.execute('DELETE FROM post_fts')
+            for batch in result.partitions():
+                conn.executemany('INSERT INTO post_fts(rowid, tokens) VALUES (?, ?)',
+                                 [(post_id, ' '.join(tokenize(body))) for post_id, body in batch])
+                count += len(batch)
+            conn.execute("INSERT INTO post_fts(post_fts) VALUES ('optimize')")
+        return count
+
+
+@contextmanager
+def _transaction(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+search_index = SearchIndex()
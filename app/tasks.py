@@ -0,0 +1,396 @@
+"""
+后台任务队列。
+写请求只提交主数据（如 post 行），时间线写扩散、计数更新、全文索引等副作用放进队列，由后台线程执行。
+任务在当前数据库事务提交后才可见，事务回滚时一并丢弃。
+
+两种后端：
+- 'database'：任务写入 task 表，与业务数据在同一个事务中提交，进程崩溃也不会丢失，
+  不依赖 Redis；任务在自己的事务中执行，执行成功与删除任务行一起提交。
+  可以由 Web 进程内的线程执行，也可以只由 flask run-worker 进程执行（TASK_WORKERS = 0）。
+- 'memory'：进程内的队列，进程退出时未执行的任务会丢失。
+TASK_EAGER 打开时在提交后立即于当前线程执行，便于测试。
+失败的任务按指数退避重试，超过 TASK_MAX_ATTEMPTS 次后不再执行（数据库后端保留在表中供排查）。
+"""
+import atexit
+import heapq
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class Job(object):
+    """一个待执行的任务"""
+
+    def __init__(self, name, args, kwargs, id=None, attempts=0, enqueued_at=None, run_at=None):
+        self.id = id
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = attempts
+        self.enqueued_at = enqueued_at or time.time()
+        self.run_at = run_at or self.enqueued_at
+
+    def __repr__(self):
+        return '<Job {} {}>'.format(self.id, self.name)
+
+
+class MemoryBackend(object):
+    """进程内队列，按计划执行时间排序，重试的任务到时间才能取出"""
+
+    def __init__(self):
+        self._heap = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+
+    def prepare(self, db_session, job):
+        job.id = next(self._ids)
+
+    def publish(self, jobs):
+        with self._cond:
+            for job in jobs:
+                heapq.heappush(self._heap, (job.run_at, job.id, job))
+            self._cond.notify(len(jobs))
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def claim(self, timeout):
+        """
+        取出一个到期的任务
+        :param timeout: 队列中没有到期任务时最多等待的秒数
+        :return: Job，超时返回 None
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    job = heapq.heappop(self._heap)[2]
+                    job.attempts += 1
+                    return job
+                if now >= deadline:
+                    return None
+                wait = deadline - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                self._cond.wait(wait)
+
+    def complete(self, job):
+        pass
+
+    def fail(self, job, error, retry_at):
+        if retry_at is not None:
+            job.run_at = retry_at
+            self.publish([job])
+
+    def stats(self):
+        with self._cond:
+            oldest = min((job.enqueued_at for _, _, job in self._heap), default=None)
+            return {'depth': len(self._heap), 'failed': None,
+                    'oldest_age': round(time.time() - oldest, 3) if oldest else 0}
+
+
+class DatabaseBackend(object):
+    """
+    task 表中的持久化队列。
+    多个进程同时取任务时用带条件的 UPDATE 抢占租约，只有一个能成功；
+    执行者崩溃后租约到期（TASK_LEASE），任务可以被重新取走
+    """
+
+    def __init__(self, app, lease=300, batch_size=10):
+        self.app = app
+        self.lease = lease
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+
+    def prepare(self, db_session, job):
+        from app.models import Task
+        db_session.add(Task(name=job.name, payload=json.dumps([job.args, job.kwargs]),
+                            enqueued_at=datetime.utcfromtimestamp(job.enqueued_at),
+                            run_at=datetime.utcfromtimestamp(job.run_at)))
+
+    def publish(self, jobs):
+        # 任务行已随业务事务提交，只需唤醒本进程内等待的执行线程
+        self.wake()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def claim(self, timeout):
+        job = self._claim()
+        if job is None and timeout > 0:
+            # 空闲时等待轮询间隔，本进程有新任务提交时提前唤醒
+            if self._wakeup.wait(timeout):
+                self._wakeup.clear()
+                job = self._claim()
+        return job
+
+    def _claim(self):
+        from app.models import db, Task
+        now = datetime.utcnow()
+        available = db.and_(
+            Task.failed_at.is_(None),
+            db.or_(Task.locked_until.is_(None), Task.locked_until < now))
+        with self.app.app_context():
+            candidates = db.session.execute(
+                db.select(Task.id).where(available, Task.run_at <= now)
+                .order_by(Task.run_at, Task.id).limit(self.batch_size)).scalars().all()
+            for task_id in candidates:
+                claimed = db.session.execute(
+                    db.update(Task).where(Task.id == task_id, available)
+                    .values(locked_until=now + timedelta(seconds=self.lease),
+                            attempts=Task.attempts + 1)
+                    .execution_options(synchronize_session=False))
+                if claimed.rowcount != 1:
+                    # 被其他执行者抢先取走
+                    continue
+                task = db.session.get(Task, task_id)
+                args, kwargs = json.loads(task.payload)
+                job = Job(task.name, args, kwargs, id=task.id, attempts=task.attempts,
+                          enqueued_at=_timestamp(task.enqueued_at))
+                db.session.commit()
+                return job
+            db.session.rollback()
+        return None
+
+    def complete(self, job):
+        # 在任务自己的事务中删除，与任务的数据修改一起提交
+        from app.models import db, Task
+        db.session.execute(db.delete(Task).where(Task.id == job.id))
+
+    def fail(self, job, error, retry_at):
+        from app.models import db, Task
+        values = {'locked_until': None, 'last_error': error[:1000]}
+        if retry_at is None:
+            values['failed_at'] = datetime.utcnow()
+        else:
+            values['run_at'] = datetime.utcfromtimestamp(retry_at)
+        with self.app.app_context():
+            db.session.execute(db.update(Task).where(Task.id == job.id).values(**values))
+            db.session.commit()
+
+    def stats(self):
+        from app.models import db, Task
+        with self.app.app_context():
+            depth, oldest = db.session.execute(
+                db.select(db.func.count(), db.func.min(Task.enqueued_at))
+                .where(Task.failed_at.is_(None))).one()
+            failed = db.session.execute(
+                db.select(db.func.count()).where(Task.failed_at.isnot(None))).scalar()
+        age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+        return {'depth': depth, 'failed': failed, 'oldest_age': round(age, 3)}
+
+
+def _timestamp(value):
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None
+    pick = lambda q: values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+    return {'p50': round(pick(0.5) * 1000, 2), 'p95': round(pick(0.95) * 1000, 2),
+            'max': round(values[-1] * 1000, 2)}
+
+
+class TaskQueue(object):
+    """
+    配置项：
+    TASK_QUEUE_BACKEND: 'database' 或 'memory'
+    TASK_EAGER: 提交后立即在当前线程执行，不经过后台线程
+    TASK_WORKERS: Web 进程内执行任务的线程数，0 表示只由 flask run-worker 执行
+    TASK_MAX_ATTEMPTS: 最多执行次数
+    TASK_RETRY_DELAY: 第一次重试前等待的秒数，之后每次翻倍
+    TASK_POLL_INTERVAL: 数据库队列为空时的轮询间隔
+    TASK_LEASE: 数据库后端取走任务后的租约秒数
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self.eager = False
+        self.workers = 0
+        self._tasks = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._counters = {'enqueued': 0, 'succeeded': 0, 'retried': 0, 'dead': 0}
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.eager = app.config.get('TASK_EAGER', False)
+        self.workers = app.config.get('TASK_WORKERS', 2)
+        self.max_attempts = app.config.get('TASK_MAX_ATTEMPTS', 5)
+        self.retry_delay = app.config.get('TASK_RETRY_DELAY', 2)
+        self.poll_interval = app.config.get('TASK_POLL_INTERVAL', 1)
+        name = app.config.get('TASK_QUEUE_BACKEND', 'database')
+        if self.eager:
+            # 立即执行的任务不需要持久化
+            self.backend = MemoryBackend()
+        elif name == 'database':
+            self.backend = DatabaseBackend(app, app.config.get('TASK_LEASE', 300))
+        elif name == 'memory':
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError('unknown task queue backend {!r}'.format(name))
+        app.extensions['task_queue'] = self
+        atexit.register(self.stop)
+
+    def task(self, name):
+        """
+        注册任务函数。任务在自己的数据库事务中执行，由队列提交，函数内不要提交
+        :param name: 任务名，入队时使用
+        """
+        def decorator(f):
+            self._tasks[name] = f
+            return f
+        return decorator
+
+    def enqueue(self, name, *args, **kwargs):
+        """
+        把任务加入队列，当前事务提交后才会执行。参数必须可以编码为 JSON
+        :param name: task 注册的任务名
+        """
+        from app.models import db
+        if name not in self._tasks:
+            raise LookupError('unknown task {!r}'.format(name))
+        job = Job(name, list(args), kwargs)
+        self.backend.prepare(db.session, job)
+        db.session.info.setdefault('task_queue', []).append(job)
+
+    def _after_commit(self, jobs):
+        self._count('enqueued', len(jobs))
+        if self.eager:
+            for job in jobs:
+                job.attempts += 1
+                self._execute(job)
+            return
+        self.backend.publish(jobs)
+        self._ensure_workers()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _execute(self, job):
+        """在新的应用上下文中执行一个任务，成功时返回 True"""
+        from app.models import db
+        started = time.time()
+        self._wait_times.append(started - job.enqueued_at)
+        with self.app.app_context():
+            try:
+                func = self._tasks.get(job.name)
+                if func is None:
+                    raise LookupError('unknown task {!r}'.format(job.name))
+                func(*job.args, **job.kwargs)
+                self.backend.complete(job)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self._failed(job, e)
+                return False
+            finally:
+                self._run_times.append(time.time() - started)
+        self._count('succeeded')
+        return True
+
+    def _failed(self, job, error):
+        retry_at = None
+        if not self.eager and job.attempts < self.max_attempts:
+            retry_at = time.time() + self.retry_delay * 2 ** (job.attempts - 1)
+        self.app.logger.exception('task %s failed (attempt %d%s)', job.name, job.attempts,
+                                  '' if retry_at else ', giving up')
+        self._count('retried' if retry_at else 'dead')
+        self.backend.fail(job, repr(error), retry_at)
+
+    def work(self, burst=False):
+        """
+        执行任务直到 stop()；burst 为 True 时队列中没有到期的任务就返回
+        :return: 执行的任务数
+        """
+        done = 0
+        while not self._stopped.is_set():
+            try:
+                job = self.backend.claim(0 if burst else self.poll_interval)
+            except Exception:
+                self.app.logger.exception('failed to claim a task')
+                self._stopped.wait(self.poll_interval)
+                continue
+            if job is None:
+                if burst:
+                    break
+                continue
+            self._execute(job)
+            done += 1
+        return done
+
+    def start(self, workers=None):
+        """
+        启动进程内的执行线程，通常在第一次提交任务时自动启动
+        :param workers: 线程数，默认 TASK_WORKERS
+        """
+        if workers is not None:
+            self.workers = workers
+        self._ensure_workers()
+
+    def running(self):
+        """是否还有执行线程在运行"""
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _ensure_workers(self):
+        if self.workers <= 0:
+            return
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if len(self._threads) >= self.workers:
+                return
+            self._stopped.clear()
+            for i in range(self.workers - len(self._threads)):
+                thread = threading.Thread(target=self.work, name='task-worker', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """停止进程内的执行线程，正在执行的任务会执行完"""
+        self._stopped.set()
+        if self.backend is not None:
+            self.backend.wake()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=timeout)
+
+    def stats(self):
+        """队列深度、最老任务的等待时间，以及本进程执行任务的计数和延迟（毫秒）"""
+        data = self.backend.stats()
+        with self._lock:
+            data.update(self._counters)
+        data['wait_ms'] = _percentiles(list(self._wait_times))
+        data['run_ms'] = _percentiles(list(self._run_times))
+        return data
+
+
+task_queue = TaskQueue()
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(db_session):
+    jobs = db_session.info.pop('task_queue', None)
+    if jobs:
+        task_queue._after_commit(jobs)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_jobs(db_session):
+    db_session.info.pop('task_queue', None)
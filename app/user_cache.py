@@ -0,0 +1,116 @@
+"""
+登录用户缓存。
+Flask-Login 每个请求都要调用 user_loader，原来每次都执行一次 SELECT 加载完整的 User。
+这里在进程内按用户 id 缓存认证所需的少量字段（LRU，短 TTL），返回一个轻量的 SessionUser，
+视图真正访问其他属性或方法时才加载 ORM 对象。
+用户的版本号变化（资料、密码、计数修改）时在事务提交后删除缓存条目；
+其他进程中的修改最迟在 TTL 后生效。
+"""
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache import LRUBackend
+
+
+class SessionUser(UserMixin):
+    """
+    current_user 使用的轻量用户对象，只带 id、username 和 version。
+    访问其他属性（如 add_post、timeline）时在当前数据库会话中加载完整的 User 并转发
+    """
+
+    def __init__(self, id, username, version):
+        self.id = id
+        self.username = username
+        self.version = version
+        self._model = None
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def model(self):
+        """当前请求中的完整 User 对象，首次访问时加载"""
+        if self._model is None:
+            from app.models import db, User
+            self._model = db.session.get(User, self.id)
+            if self._model is None:
+                raise LookupError('user {} no longer exists'.format(self.id))
+            if self._model.version != self.version:
+                # 缓存中的版本已过时，顺便更新
+                user_cache.forget(self.id)
+        return self._model
+
+    def __getattr__(self, name):
+        # 只有实例上没有的属性才会走到这里
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __repr__(self):
+        return '<SessionUser {}>'.format(self.username)
+
+
+class UserCache(object):
+    """
+    配置项：
+    USER_CACHE_TTL: 缓存条目的过期秒数，<= 0 时关闭缓存，每次都查询数据库
+    USER_CACHE_MAX_ENTRIES: 最多缓存的用户数
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', 30)
+        max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', 10000)
+        self.backend = LRUBackend(max_entries) if self.ttl > 0 else None
+        app.extensions['user_cache'] = self
+
+    def load(self, user_id):
+        """
+        user_loader 使用：返回 SessionUser，用户不存在时返回 None
+        :param user_id: 会话中保存的用户 id
+        """
+        user_id = int(user_id)
+        if self.backend is not None:
+            entry = self.backend.get(user_id)
+            if entry is not None:
+                return SessionUser(user_id, *entry)
+        from app.models import db, User
+        row = db.session.query(User.username, User.version).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        if self.backend is not None:
+            self.backend.set(user_id, (row.username, row.version), self.ttl)
+        return SessionUser(user_id, row.username, row.version)
+
+    def forget(self, *user_ids):
+        """立即删除缓存条目"""
+        if self.backend is not None:
+            for user_id in user_ids:
+                self.backend.delete(user_id)
+
+    def invalidate_on_commit(self, db_session, *user_ids):
+        """
+        在数据库事务提交后删除缓存条目，避免提交前被其他请求用旧数据重新填充
+        :param db_session: 当前数据库会话
+        """
+        db_session.info.setdefault('user_cache_invalidate', set()).update(user_ids)
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_after_commit(db_session):
+    user_ids = db_session.info.pop('user_cache_invalidate', None)
+    if user_ids:
+        user_cache.forget(*user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_forget(db_session):
+    db_session.info.pop('user_cache_invalidate', None)
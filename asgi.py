@@ -0,0 +1,178 @@
+"""
+ASGI 入口，供 uvicorn / hypercorn 等 ASGI 服务器使用：
+
+    uvicorn asgi:app --workers 4
+
+这里自带一个最小的 ASGI → WSGI 适配器：每个 HTTP 请求在 ASGI_THREADS 大小的线程池中执行 Flask 应用，
+Flask 的异步视图（/api/async/v1.0）通过 Flask.async_to_sync 交回服务器的事件循环执行，
+共用一个异步连接池，等待数据库时不占用连接以外的资源。
+Flask 仍按 WSGI 处理每个请求，异步视图执行期间该请求仍占用线程池中的一个线程（只等待事件循环，不占数据库连接），
+所以并发请求数受 ASGI_THREADS 限制。
+需要安装 aiomysql 或 asyncmy（本地 SQLite 用 aiosqlite）。
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import sys
+from tempfile import SpooledTemporaryFile
+
+from app import create_app
+from app.async_db import async_db
+
+flask_app = create_app()
+async_db.use_shared_loop()
+
+
+class Application(object):
+    """
+    把 WSGI 应用包装成 ASGI 应用
+    :param wsgi_app: Flask 应用
+    :param threads: 执行 WSGI 调用的线程数
+    """
+
+    def __init__(self, wsgi_app, threads=64):
+        self.wsgi_app = wsgi_app
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads,
+                                                              thread_name_prefix='asgi')
+        self.loop = None
+        wsgi_app.async_to_sync = self.async_to_sync
+
+    async def __call__(self, scope, receive, send):
+        self.loop = asyncio.get_running_loop()
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError('unsupported ASGI scope {!r}'.format(scope['type']))
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            await self.loop.run_in_executor(self.executor, self.run_wsgi, scope, body, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def async_to_sync(self, func):
+        """
+        替换 Flask.async_to_sync：在线程池的线程中调用异步视图时，把协程交给服务器的事件循环执行并等待结果。
+        协程在当前线程上下文变量的副本中运行，能看到 Flask 的请求上下文
+        """
+        loop = self.loop
+        if loop is None:
+            # 不在 ASGI 服务器中（如命令行），沿用 Flask 默认的实现
+            return type(self.wsgi_app).async_to_sync(self.wsgi_app, func)
+
+        def run(*args, **kwargs):
+            context = contextvars.copy_context()
+            future = concurrent.futures.Future()
+
+            def start():
+                task = context.run(loop.create_task, func(*args, **kwargs))
+                task.add_done_callback(lambda done: _copy_result(done, future))
+
+            loop.call_soon_threadsafe(start)
+            return future.result()
+        return run
+
+    def run_wsgi(self, scope, body, send):
+        """在线程池中执行一次 WSGI 调用，把响应转成 ASGI 消息发送"""
+        loop = self.loop
+
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        state = {'start': None, 'sent': False}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and state['sent']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            state['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                            for name, value in headers],
+            }
+            return write
+
+        def write(data):
+            if not state['sent']:
+                state['sent'] = True
+                send_sync(state['start'])
+            if data:
+                send_sync({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        iterable = self.wsgi_app(_environ(scope, body), start_response)
+        try:
+            for data in iterable:
+                write(data)
+        finally:
+            # WSGI 要求调用 close()，流式响应在这里结束请求上下文
+            if hasattr(iterable, 'close'):
+                iterable.close()
+        write(b'')
+        send_sync({'type': 'http.response.body'})
+
+
+def _copy_result(task, future):
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+def _environ(scope, body):
+    """由 ASGI 的 HTTP scope 和请求体生成 WSGI environ"""
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin1')
+    path_info = scope['path'].encode('utf-8').decode('latin1')
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        # 重复的请求头按 WSGI 约定用逗号合并
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+app = Application(flask_app, flask_app.config.get('ASGI_THREADS', 64))
@@ -0,0 +1,80 @@
+"""
+比较各 JSON 编码器序列化一页 /api/v1.0/users 响应（默认 100 个用户）的耗时：
+
+    python -m benchmarks.encoders --per-page 100 --rounds 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+ENCODERS = ('stdlib', 'orjson', 'msgspec')
+
+
+def build_page(app, per_page):
+    from app.models import User
+    with app.test_request_context('/api/v1.0/users?per_page={}'.format(per_page)):
+        return User.to_collection_dict(User.query.order_by(User.id), 1, per_page, 'api.get_users')
+
+
+def time_encoder(app, page, encoder, datetime_format, sort_keys, rounds):
+    """
+    :return: (每次编码的微秒数, 输出字节数)，编码器不可用时返回 None
+    """
+    from app.json_provider import FastJSONProvider
+    app.config.update(JSON_ENCODER=encoder, JSON_DATETIME_FORMAT=datetime_format,
+                      JSON_SORT_KEYS=sort_keys)
+    try:
+        provider = FastJSONProvider(app)
+    except RuntimeError:
+        return None
+    with app.app_context():
+        body = provider.dumps_bytes(page)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            provider.dumps_bytes(page)
+        elapsed = time.perf_counter() - started
+    return elapsed / rounds * 1e6, len(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=2000)
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='microblog-bench-')
+    os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['TEST_SEARCH_INDEX_PATH'] = os.path.join(workdir, 'search.db')
+
+    from app import create_app
+    from benchmarks.seed import seed
+    app = create_app('testing')
+    with app.app_context():
+        seed(args.per_page, 0, 0, 42)
+    page = build_page(app, args.per_page)
+
+    results = {}
+    for datetime_format in ('http', 'iso'):
+        for sort_keys in (True, False):
+            for encoder in ENCODERS:
+                result = time_encoder(app, page, encoder, datetime_format, sort_keys, args.rounds)
+                name = '{}/{}/{}'.format(encoder, datetime_format, 'sorted' if sort_keys else 'unsorted')
+                if result is None:
+                    print('{:<26} not available'.format(name))
+                    continue
+                results[name] = {'us_per_page': round(result[0], 2), 'bytes': result[1]}
+                print('{:<26} {:>10.1f} us/page  {:>8} bytes'.format(name, result[0], result[1]))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__':
+    main()
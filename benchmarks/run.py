@@ -0,0 +1,228 @@
+"""
+Web 和 API 端点的基准测试。
+
+在本地 SQLite 数据库中生成可复现的数据，然后用 Flask 测试客户端依次压测各个端点，
+输出吞吐量、p50/p95/p99 延迟和每个请求的 SQL 条数。结果可保存为 JSON，
+再用 --compare 与另一次提交的结果对比：
+
+    python -m benchmarks.run --users 1000 --posts 10000 --follows 5000 --output before.json
+    python -m benchmarks.run --users 1000 --posts 10000 --follows 5000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+# 不经过 HTTP 的场景返回的结果
+Result = namedtuple('Result', 'status_code')
+
+
+class StatementCounter(object):
+    """统计引擎执行的 SQL 条数"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(Engine, 'before_cursor_execute', self._count)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def scenarios(app, client, args, rng):
+    """
+    返回 [(名称, 发送一次请求的函数)]
+    需要登录的页面共用一个已登录的测试客户端，API 详情接口使用登录接口签发的 JWT
+    """
+    from benchmarks.seed import PASSWORD
+    username = 'user1'
+    response = client.post('/auth/login', data={'username': username, 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError('login failed: {}'.format(response.status_code))
+    api = app.test_client()
+    token = api.post('/api/v1.0/users/login',
+                     json={'username': username, 'password': PASSWORD}).get_json() or {}
+    headers = {'Authorization': 'Bearer {}'.format(token.get('access_token', ''))}
+    pages = max(1, args.users // args.per_page)
+
+    def verify_jwt():
+        # 只计签名校验、载荷解码和吊销检查的耗时，不含路由和响应序列化
+        from flask_jwt_extended import decode_token
+        with app.app_context():
+            payload = decode_token(token.get('access_token', ''))
+            revoked = app.extensions['revocation_list'].is_revoked(payload)
+        return Result(401 if revoked else 200)
+
+    def follow_graph():
+        # 一页用户列表的关注状态加上推荐关注
+        from app.follow_graph import follow_graph
+        user_id = rng.randint(1, args.users)
+        with app.app_context():
+            follow_graph.following_among(user_id, range(1, min(args.users, args.per_page) + 1))
+            follow_graph.suggestions(user_id)
+        return Result(200)
+
+    return [
+        ('index', lambda: client.get('/auth/index')),
+        ('user_page', lambda: client.get('/auth/user/user{}'.format(rng.randint(1, args.users)))),
+        ('api_users', lambda: api.get('/api/v1.0/users?page={}&per_page={}'.format(
+            rng.randint(1, pages), args.per_page))),
+        ('api_user', lambda: api.get('/api/v1.0/users/1', headers=headers)),
+        ('api_posts', lambda: api.get('/api/v1.0/posts?cursor=&per_page={}'.format(args.per_page))),
+        ('api_posts_sparse', lambda: api.get(
+            '/api/v1.0/posts?cursor=&per_page={}&fields=id,timestamp,author_id&format=columns'.format(
+                args.per_page))),
+        ('api_me', lambda: api.get('/api/v1.0/users/me', headers=headers)),
+        ('jwt_verify', verify_jwt),
+        ('follow_graph', follow_graph),
+        ('api_login', lambda: api.post('/api/v1.0/users/login', json={
+            'username': 'user{}'.format(rng.randint(1, args.users)), 'password': PASSWORD})),
+    ]
+
+
+def measure(name, send, counter, requests, warmup):
+    for _ in range(warmup):
+        send()
+    latencies, statements, statuses = [], [], {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        before = counter.count
+        t0 = time.perf_counter()
+        response = send()
+        latencies.append(time.perf_counter() - t0)
+        statements.append(counter.count - before)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'throughput_rps': round(requests / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'mean': round(sum(latencies) / requests * 1000, 3),
+        },
+        'statements_per_request': {
+            'mean': round(sum(statements) / requests, 2),
+            'max': max(statements),
+        },
+        'status': {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """打印与基线结果的对比，延迟和 SQL 条数越低越好，吞吐量越高越好"""
+    print('\ncompared with {} ({})'.format(baseline['meta'].get('revision'),
+                                           baseline['meta'].get('timestamp')))
+    for name, current in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        print('{:<16} rps {:>9.1f} -> {:>9.1f} ({:+.1f}%)  p95 {:>8.2f} -> {:>8.2f}ms ({:+.1f}%)  '
+              'sql {:>6.1f} -> {:>6.1f}'.format(
+                  name, old['throughput_rps'], current['throughput_rps'],
+                  _change(old['throughput_rps'], current['throughput_rps']),
+                  old['latency_ms']['p95'], current['latency_ms']['p95'],
+                  _change(old['latency_ms']['p95'], current['latency_ms']['p95']),
+                  old['statements_per_request']['mean'], current['statements_per_request']['mean']))
+
+
+def _change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--follows', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200, help='每个端点的计时请求数')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=100, help='/api/v1.0/users 的 per_page')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', default='null', choices=('null', 'lru', 'filesystem'))
+    parser.add_argument('--only', action='append', help='只运行指定端点，可重复')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    parser.add_argument('--compare', help='与之前保存的 JSON 结果对比')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='microblog-bench-')
+    os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['TEST_SEARCH_INDEX_PATH'] = os.path.join(workdir, 'search.db')
+    os.environ['CACHE_TYPE'] = args.cache
+    os.environ.setdefault('CACHE_DIR', os.path.join(workdir, 'cache'))
+
+    from app import create_app
+    from benchmarks.seed import seed
+    app = create_app('testing')
+    app.config['CACHE_DIR'] = os.environ['CACHE_DIR']
+    with app.app_context():
+        t0 = time.perf_counter()
+        users, posts, follows = seed(args.users, args.posts, args.follows, args.seed)
+        print('seeded {} users, {} posts, {} follows in {:.1f}s'.format(
+            users, posts, follows, time.perf_counter() - t0))
+
+    rng = random.Random(args.seed)
+    counter = StatementCounter()
+    results = {}
+    try:
+        for name, send in scenarios(app, app.test_client(), args, rng):
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure(name, send, counter, args.requests, args.warmup)
+            r = results[name]
+            print('{:<16} {:>9.1f} req/s  p50 {:>8.2f}ms  p95 {:>8.2f}ms  p99 {:>8.2f}ms  '
+                  'sql/req {:>6.1f}  status {}'.format(
+                      name, r['throughput_rps'], r['latency_ms']['p50'], r['latency_ms']['p95'],
+                      r['latency_ms']['p99'], r['statements_per_request']['mean'], r['status']))
+    finally:
+        counter.close()
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'users': users, 'posts': posts, 'follows': follows,
+            'requests': args.requests, 'warmup': args.warmup, 'per_page': args.per_page,
+            'seed': args.seed, 'cache': args.cache,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return report
+
+
+if __name__ == '__main__':
+    main()
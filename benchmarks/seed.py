@@ -0,0 +1,69 @@
+"""
+为基准测试生成可复现的数据：用户、文章和关注关系。
+同一个 seed 和规模参数总是生成相同的数据，便于在不同提交之间对比结果。
+"""
+import random
+from datetime import datetime, timedelta
+
+from app.hashing import hasher
+from app.models import db, email_digest, followers, Post, Timeline, User
+
+PASSWORD = 'benchmark'
+
+
+def seed(users=1000, posts=10000, follows=5000, seed=42, batch=1000):
+    """
+    在当前应用上下文的数据库中建表并写入数据
+    :param users: 用户数
+    :param posts: 文章数，随机分配给用户
+    :param follows: 关注关系数（去重、不含自己关注自己）
+    :param seed: 随机数种子
+    :return: 实际写入的 (users, posts, follows)
+    """
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    # 所有用户共用一个密码哈希，避免造数时间被哈希计算占满
+    password_hash = hasher.hash(PASSWORD)
+    start = datetime(2025, 1, 1)
+
+    rows = [{'id': i, 'username': 'user{}'.format(i), 'email': 'user{}@example.com'.format(i),
+             'email_hash': email_digest('user{}@example.com'.format(i)),
+             'password_hash': password_hash, 'about_me': 'benchmark user {}'.format(i),
+             'last_seen': start, 'updated_at': start}
+            for i in range(1, users + 1)]
+    _insert(User.__table__, rows, batch)
+
+    rows = [{'id': i, 'body': 'post {} '.format(i) * rng.randint(1, 10),
+             'timestamp': start + timedelta(seconds=i * 60 + rng.randint(0, 59)),
+             'user_id': rng.randint(1, users)}
+            for i in range(1, posts + 1)]
+    _insert(Post.__table__, rows, batch)
+
+    edges = set()
+    limit = min(follows, users * (users - 1))
+    while len(edges) < limit:
+        a, b = rng.randint(1, users), rng.randint(1, users)
+        if a != b:
+            edges.add((a, b))
+    rows = [{'follower_id': a, 'followed_id': b} for a, b in sorted(edges)]
+    _insert(followers, rows, batch)
+
+    # 物化时间线和冗余计数与应用写入时保持一致
+    timeline = Timeline.__table__
+    db.session.execute(timeline.insert().from_select(
+        ['owner_id', 'timestamp', 'post_id', 'author_id'],
+        db.select(Post.user_id, Post.timestamp, Post.id, Post.user_id)))
+    db.session.execute(timeline.insert().from_select(
+        ['owner_id', 'timestamp', 'post_id', 'author_id'],
+        db.select(followers.c.follower_id, Post.timestamp, Post.id, Post.user_id).join(
+            Post, Post.user_id == followers.c.followed_id)))
+    db.session.commit()
+    User.reconcile_counters()
+    return users, posts, len(edges)
+
+
+def _insert(table, rows, batch):
+    for i in range(0, len(rows), batch):
+        db.session.execute(table.insert(), rows[i:i + batch])
+    db.session.commit()
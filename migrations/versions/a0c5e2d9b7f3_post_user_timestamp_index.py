@@ -0,0 +1,26 @@
+"""post (user_id, timestamp) index
+
+Revision ID: a0c5e2d9b7f3
+Revises: f3c81a2d7e54
+Create Date: 2026-10-18 17:12:48.604113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a0c5e2d9b7f3'
+down_revision = 'f3c81a2d7e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_user_id_timestamp', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_user_id_timestamp')
@@ -0,0 +1,38 @@
+"""denormalized user counters
+
+Revision ID: b51e3c7a9d20
+Revises: a93a9d3e4183
+Create Date: 2026-10-18 10:02:11.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b51e3c7a9d20'
+down_revision = 'a93a9d3e4183'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('followed_count', sa.Integer(), server_default='0', nullable=False))
+
+    # 回填已有数据
+    op.execute(
+        'UPDATE user SET '
+        'post_count = (SELECT COUNT(*) FROM post WHERE post.user_id = user.id), '
+        'follower_count = (SELECT COUNT(*) FROM followers WHERE followers.followed_id = user.id), '
+        'followed_count = (SELECT COUNT(*) FROM followers WHERE followers.follower_id = user.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('followed_count')
+        batch_op.drop_column('follower_count')
+        batch_op.drop_column('post_count')
@@ -0,0 +1,49 @@
+"""followers unique index
+
+Revision ID: b8e4d1f6a2c9
+Revises: a0c5e2d9b7f3
+Create Date: 2026-10-18 18:03:27.511946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4d1f6a2c9'
+down_revision = 'a0c5e2d9b7f3'
+branch_labels = None
+depends_on = None
+
+followers = sa.table('followers', sa.column('follower_id'), sa.column('followed_id'))
+
+
+def upgrade():
+    # 建唯一索引前先删除重复的关注关系，每对只保留一行
+    conn = op.get_bind()
+    duplicates = conn.execute(
+        sa.select(followers.c.follower_id, followers.c.followed_id)
+        .group_by(followers.c.follower_id, followers.c.followed_id)
+        .having(sa.func.count() > 1)).fetchall()
+    for follower_id, followed_id in duplicates:
+        pair = sa.and_(followers.c.follower_id == follower_id,
+                       followers.c.followed_id == followed_id)
+        conn.execute(followers.delete().where(pair))
+        conn.execute(followers.insert().values(follower_id=follower_id, followed_id=followed_id))
+    if duplicates:
+        # 重复行也被计入过冗余计数
+        op.execute(
+            'UPDATE user SET '
+            'follower_count = (SELECT COUNT(*) FROM followers WHERE followers.followed_id = user.id), '
+            'followed_count = (SELECT COUNT(*) FROM followers WHERE followers.follower_id = user.id)'
+        )
+
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.create_index('ix_followers_follower_id_followed_id', ['follower_id', 'followed_id'], unique=True)
+        batch_op.create_index('ix_followers_followed_id_follower_id', ['followed_id', 'follower_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.drop_index('ix_followers_followed_id_follower_id')
+        batch_op.drop_index('ix_followers_follower_id_followed_id')
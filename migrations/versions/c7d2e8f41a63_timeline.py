@@ -0,0 +1,52 @@
+"""materialized timeline
+
+Revision ID: c7d2e8f41a63
+Revises: b51e3c7a9d20
+Create Date: 2026-10-18 11:40:52.117304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e8f41a63'
+down_revision = 'b51e3c7a9d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+    sa.PrimaryKeyConstraint('owner_id', 'timestamp', 'post_id')
+    )
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.create_index('ix_timeline_owner_author', ['owner_id', 'author_id'], unique=False)
+
+    # 回填：每篇文章写入作者本人和所有粉丝的时间线
+    op.execute(
+        'INSERT INTO timeline (owner_id, timestamp, post_id, author_id) '
+        'SELECT user_id, timestamp, id, user_id FROM post '
+        'WHERE user_id IS NOT NULL AND timestamp IS NOT NULL'
+    )
+    op.execute(
+        'INSERT INTO timeline (owner_id, timestamp, post_id, author_id) '
+        'SELECT DISTINCT f.follower_id, p.timestamp, p.id, p.user_id '
+        'FROM followers f JOIN post p ON p.user_id = f.followed_id '
+        'WHERE f.follower_id IS NOT NULL AND f.follower_id != f.followed_id '
+        'AND p.timestamp IS NOT NULL'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('timeline', schema=None) as batch_op:
+        batch_op.drop_index('ix_timeline_owner_author')
+
+    op.drop_table('timeline')
@@ -0,0 +1,41 @@
+"""user email hash
+
+Revision ID: d4a9f0b6e215
+Revises: c7d2e8f41a63
+Create Date: 2026-10-18 13:05:37.562081
+
+"""
+from hashlib import md5
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9f0b6e215'
+down_revision = 'c7d2e8f41a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('email_hash', sa.String(length=32), nullable=True))
+
+    # 回填已有用户的邮箱摘要，与 app.models.email_digest 保持一致
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('email', sa.String),
+                    sa.column('email_hash', sa.String))
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(user.c.id, user.c.email).where(user.c.email.isnot(None))).all()
+    if rows:
+        conn.execute(
+            user.update().where(user.c.id == sa.bindparam('user_id'))
+            .values(email_hash=sa.bindparam('digest')),
+            [{'user_id': id, 'digest': md5(email.lower().encode('utf-8')).hexdigest()}
+             for id, email in rows]
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('email_hash')
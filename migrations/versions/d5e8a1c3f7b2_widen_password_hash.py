@@ -0,0 +1,33 @@
+"""widen user.password_hash
+
+Revision ID: d5e8a1c3f7b2
+Revises: c2f9a7e3d4b1
+Create Date: 2026-10-18 20:12:05.734918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e8a1c3f7b2'
+down_revision = 'c2f9a7e3d4b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # werkzeug 的 scrypt 哈希长 162 个字符，超过原来的 128
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=256),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=256),
+               type_=sa.String(length=128),
+               existing_nullable=True)
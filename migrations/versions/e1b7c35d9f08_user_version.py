@@ -0,0 +1,30 @@
+"""user row version
+
+Revision ID: e1b7c35d9f08
+Revises: d4a9f0b6e215
+Create Date: 2026-10-18 14:22:09.871540
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b7c35d9f08'
+down_revision = 'd4a9f0b6e215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute('UPDATE user SET updated_at = COALESCE(last_seen, CURRENT_TIMESTAMP)')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
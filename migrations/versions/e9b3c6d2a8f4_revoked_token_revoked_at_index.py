@@ -0,0 +1,26 @@
+"""revoked_token.revoked_at index
+
+Revision ID: e9b3c6d2a8f4
+Revises: d5e8a1c3f7b2
+Create Date: 2026-10-18 20:41:18.205637
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b3c6d2a8f4'
+down_revision = 'd5e8a1c3f7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_token_revoked_at'), ['revoked_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_token_revoked_at'))
@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+import pytest
+
+# 全文索引文件放到临时目录，需要在导入配置之前设置
+os.environ.setdefault('TEST_SEARCH_INDEX_PATH',
+                      os.path.join(tempfile.mkdtemp(), 'search-test.db'))
+
+from app import create_app
+from app.last_seen import last_seen_tracker
+from app.models import db, PaginatedAPIMixin, User
+from config import TestingConfig
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'config(**settings): 覆盖单个测试的应用配置')
+
+
+@pytest.fixture
+def app(request, monkeypatch):
+    # 限流、哈希服务和缓存在 create_app 时读取配置，需要在创建应用之前覆盖
+    marker = request.node.get_closest_marker('config')
+    for name, value in (marker.kwargs.items() if marker else ()):
+        monkeypatch.setattr(TestingConfig, name, value)
+    app = create_app('testing')
+    # 进程内复用的分页总数按 SQL 语句缓存，不能带到下一个测试的数据库
+    PaginatedAPIMixin._count_cache.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        # 缓冲中的 last_seen 在删表之前写回
+        last_seen_tracker.flush()
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(username, password='password'):
+    """
+    创建并提交一个用户
+    :return: 用户
+    """
+    user = User(username=username, email='{}@example.com'.format(username))
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, username, password='password'):
+    response = client.post('/auth/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+
+
+def get_tokens(client, username, password='password'):
+    """
+    通过 API 登录
+    :return: 访问令牌和刷新令牌
+    """
+    response = client.post('/api/v1.0/tokens', json={'username': username, 'password': password})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def auth_header(token):
+    return {'Authorization': 'Bearer {}'.format(token)}
@@ -0,0 +1,97 @@
+"""
+用户 API：条件请求、游标分页和写入后的缓存失效
+"""
+import base64
+import json
+
+import pytest
+
+from app.models import db, User
+
+from .conftest import auth_header, get_tokens, make_user
+
+
+def _cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+@pytest.fixture
+def users(app):
+    return [make_user('user{}'.format(i)) for i in range(5)]
+
+
+def test_users_etag_returns_304_until_a_user_changes(client, users):
+    response = client.get('/api/v1.0/users?per_page=2')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag.startswith('W/')
+
+    response = client.get('/api/v1.0/users?per_page=2', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+    users[0].from_dict({'about_me': 'changed'})
+    db.session.commit()
+    response = client.get('/api/v1.0/users?per_page=2', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_new_user_changes_page_etag(client, users, monkeypatch):
+    # 页码模式的响应带总数，总数缓存过期后，新用户即使不在本页也要让 ETag 变化
+    monkeypatch.setattr(User, 'COUNT_CACHE_TTL', 0)
+    etag = client.get('/api/v1.0/users?per_page=2').headers['ETag']
+    make_user('another')
+    response = client.get('/api/v1.0/users?per_page=2', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['_meta']['total_items'] == 6
+
+
+def test_own_user_etag(client, users):
+    headers = auth_header(get_tokens(client, 'user0')['access_token'])
+    response = client.get('/api/v1.0/users/{}'.format(users[0].id), headers=headers)
+    assert response.status_code == 200
+    headers['If-None-Match'] = response.headers['ETag']
+    response = client.get('/api/v1.0/users/{}'.format(users[0].id), headers=headers)
+    assert response.status_code == 304
+
+
+def test_cursor_pagination_walks_all_users_once(client, users):
+    seen = []
+    url = '/api/v1.0/users?per_page=2&cursor='
+    while url:
+        data = client.get(url).get_json()
+        seen.extend(item['id'] for item in data['items'])
+        url = data['_links']['next']
+    assert seen == [user.id for user in users]
+
+
+def test_cursor_prev_link_returns_previous_page(client, users):
+    first = client.get('/api/v1.0/users?per_page=2&cursor=').get_json()
+    second = client.get(first['_links']['next']).get_json()
+    back = client.get(second['_links']['prev']).get_json()
+    assert [item['id'] for item in back['items']] == [item['id'] for item in first['items']]
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-base64!',
+    _cursor({'n': 1}),
+    _cursor(['x', 1]),
+    _cursor(['n']),
+    _cursor(['n', 1, 2]),
+    _cursor(['n', [1]]),
+    _cursor(['n', True]),
+])
+def test_bad_cursor_is_rejected(client, users, cursor):
+    response = client.get('/api/v1.0/users', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'invalid cursor'
+
+
+@pytest.mark.config(CACHE_TYPE='lru')
+def test_cached_users_list_is_invalidated_by_create(client, users):
+    assert len(client.get('/api/v1.0/users').get_json()['items']) == 5
+    response = client.post('/api/v1.0/users', json={
+        'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'password'})
+    assert response.status_code == 201
+    items = client.get('/api/v1.0/users').get_json()['items']
+    assert [item['username'] for item in items][-1] == 'newcomer'
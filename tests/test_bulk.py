@@ -0,0 +1,69 @@
+"""
+批量导入：每行输入对应一条结果，冲突只影响所在的行
+"""
+import json
+
+import pytest
+
+from app.models import db, User
+
+from .conftest import auth_header, get_tokens, make_user
+
+
+@pytest.fixture
+def admin_headers(app, client):
+    app.config['ADMIN_USERNAMES'] = ['admin']
+    make_user('admin')
+    return auth_header(get_tokens(client, 'admin')['access_token'])
+
+
+def _import(client, headers, lines):
+    body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+    response = client.post('/api/v1.0/users/import', data=body, headers=headers)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _user(name, email=None):
+    return {'username': name, 'email': email or '{}@example.com'.format(name), 'password': 'secret'}
+
+
+def test_import_reports_each_line(client, admin_headers):
+    make_user('taken')
+    results = _import(client, admin_headers, [
+        _user('new1'),
+        _user('taken', 'other@example.com'),
+        _user('new1', 'new1b@example.com'),
+        _user('new2', 'new1@example.com'),
+        'not json',
+        {'username': 'partial'},
+        _user('new3'),
+    ])
+    assert [(r['line'], r['status']) for r in results] == [
+        (1, 'created'), (2, 'error'), (3, 'error'), (4, 'error'), (5, 'error'), (6, 'error'),
+        (7, 'created')]
+    assert results[1]['message'] == 'please use a different username'
+    assert results[3]['message'] == 'please use a different email address'
+    assert results[4]['message'] == 'invalid JSON'
+    names = db.session.scalars(db.select(User.username).order_by(User.id)).all()
+    assert names == ['admin', 'taken', 'new1', 'new3']
+    assert db.session.scalar(db.select(User).filter_by(username='new3')).check_password('secret')
+
+
+def test_conflict_missed_by_the_check_only_skips_its_row(client, admin_headers):
+    # 模拟逐块检查之后才出现的冲突：不区分大小写的唯一索引，检查时按原样比较查不到
+    make_user('taken')
+    db.session.execute(db.text('CREATE UNIQUE INDEX ix_user_username_lower ON user (lower(username))'))
+    db.session.commit()
+    results = _import(client, admin_headers, [_user('before'), _user('TAKEN'), _user('after')])
+    assert [r['status'] for r in results] == ['created', 'error', 'created']
+    assert results[1]['message'] == 'username or email address is already in use'
+    names = db.session.scalars(db.select(User.username).order_by(User.id)).all()
+    assert names == ['admin', 'taken', 'before', 'after']
+
+
+def test_import_requires_admin(client, admin_headers):
+    make_user('someone')
+    headers = auth_header(get_tokens(client, 'someone')['access_token'])
+    response = client.post('/api/v1.0/users/import', data=json.dumps(_user('x')), headers=headers)
+    assert response.status_code == 403
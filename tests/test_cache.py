@@ -0,0 +1,58 @@
+"""
+页面和 API 缓存在写入提交后失效，发表文章的后续任务更新的计数也能立即看到
+"""
+import pytest
+
+from app.models import db, User
+
+from .conftest import login, make_user
+
+pytestmark = pytest.mark.config(CACHE_TYPE='lru')
+
+
+@pytest.fixture
+def author(app, client):
+    author = make_user('author')
+    make_user('reader')
+    login(client, 'reader')
+    return author
+
+
+def test_new_post_appears_on_cached_pages(client, author):
+    for url in ('/auth/index', '/auth/user/author'):
+        assert b'first post' not in client.get(url).data
+    author.add_post('first post')
+    db.session.commit()
+    for url in ('/auth/index', '/auth/user/author'):
+        assert b'first post' in client.get(url).data
+
+
+def test_posting_from_the_form_invalidates_the_home_page(client, author):
+    assert b'my own post' not in client.get('/auth/index').data
+    response = client.post('/auth/index', data={'body': 'my own post'})
+    assert response.status_code == 302
+    assert b'my own post' in client.get('/auth/index').data
+
+
+def _counts(client, username):
+    items = client.get('/api/v1.0/users').get_json()['items']
+    return {item['username']: item for item in items}[username]
+
+
+def test_post_count_in_cached_users_list(client, author):
+    assert _counts(client, 'author')['post_count'] == 0
+    author.add_post('one')
+    db.session.commit()
+    author.add_post('two')
+    db.session.commit()
+    assert _counts(client, 'author')['post_count'] == 2
+    assert db.session.get(User, author.id).post_count == 2
+
+
+def test_follow_counts_in_cached_users_list(client, author):
+    assert _counts(client, 'author')['follower_count'] == 0
+    reader = db.session.scalar(db.select(User).filter_by(username='reader'))
+    reader.follow(author)
+    db.session.commit()
+    assert _counts(client, 'author')['follower_count'] == 1
+    assert _counts(client, 'reader')['followed_count'] == 1
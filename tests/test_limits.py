@@ -0,0 +1,62 @@
+"""
+过载保护：超过限流返回 429，密码哈希队列满时返回 503，两者都带 Retry-After
+"""
+import pytest
+
+from app.hashing import hasher
+
+from .conftest import auth_header, get_tokens, make_user
+
+
+@pytest.mark.config(RATELIMIT_ENABLED=True, RATELIMIT_RULES={'POST api.get_tokens': '2/minute'})
+def test_token_endpoint_is_rate_limited(app, client):
+    make_user('alice')
+    get_tokens(client, 'alice')
+    get_tokens(client, 'alice')
+    response = client.post('/api/v1.0/tokens', json={'username': 'alice', 'password': 'password'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    # 规则只作用于这个端点，其他 API 不受影响
+    assert client.get('/api/v1.0/users').status_code == 200
+
+
+@pytest.mark.config(RATELIMIT_ENABLED=True, RATELIMIT_RULES={'POST auth.login': '1/minute'})
+def test_login_form_is_rate_limited(app, client):
+    make_user('alice')
+    client.post('/auth/login', data={'username': 'alice', 'password': 'wrong'})
+    response = client.post('/auth/login', data={'username': 'alice', 'password': 'password'})
+    assert response.status_code == 429
+    assert b'Too Many Requests' in response.data
+    assert 'Retry-After' in response.headers
+
+
+@pytest.fixture
+def saturated_hasher(app):
+    """占满哈希队列的唯一位置，结束后释放并关闭进程池"""
+    make_user('alice')
+    hasher._slots.acquire()
+    yield hasher
+    hasher._slots.release()
+    hasher._pool.shutdown()
+    hasher._pool = None
+
+
+@pytest.mark.config(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1,
+                    PASSWORD_HASH_QUEUE_TIMEOUT=0, PASSWORD_HASH_RETRY_AFTER=7)
+def test_login_returns_503_when_hasher_is_saturated(client, saturated_hasher):
+    response = client.post('/api/v1.0/tokens', json={'username': 'alice', 'password': 'password'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+
+    response = client.post('/auth/login', data={'username': 'alice', 'password': 'password'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+
+    # 有空位之后恢复正常
+    saturated_hasher._slots.release()
+    try:
+        tokens = get_tokens(client, 'alice')
+    finally:
+        saturated_hasher._slots.acquire()
+    assert client.get('/api/v1.0/users/me',
+                      headers=auth_header(tokens['access_token'])).status_code == 200
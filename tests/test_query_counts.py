@@ -0,0 +1,70 @@
+"""
+首页、时间线和个人主页每页的 SQL 条数不随每页文章数增长，
+作者在渲染前批量加载，模板中不会逐篇触发懒加载
+"""
+import pytest
+from sqlalchemy import event
+
+from app.models import db
+
+from .conftest import login, make_user
+
+PAGE_SIZES = (3, 10, 30)
+
+
+class StatementCounter(object):
+    """统计 with 块中引擎执行的 SQL 条数"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+@pytest.fixture
+def reader(app, client):
+    """登录的读者关注了四位作者，作者的文章交替发布，每页文章来自多个作者"""
+    reader = make_user('reader')
+    authors = [make_user('author{}'.format(i)) for i in range(4)]
+    for author in authors:
+        reader.follow(author)
+    db.session.commit()
+    for i in range(40):
+        authors[i % len(authors)].add_post('post {}'.format(i))
+        db.session.commit()
+    login(client, 'reader')
+    return reader
+
+
+def _statements_per_page(app, client, url, setting):
+    counts = []
+    for per_page in PAGE_SIZES:
+        app.config[setting] = per_page
+        # 预热一次，只统计稳定状态下的请求
+        assert client.get(url).status_code == 200
+        db.session.remove()
+        with StatementCounter(db.engine) as counter:
+            response = client.get(url)
+            response.get_data()
+        assert response.status_code == 200
+        counts.append(counter.count)
+    return counts
+
+
+@pytest.mark.parametrize('url, setting', [
+    ('/auth/index', 'POSTS_PER_PAGE'),
+    ('/auth/timeline', 'POSTS_PER_PAGE'),
+    ('/auth/user/author0', 'PROFILE_POSTS_PER_PAGE'),
+])
+def test_statements_per_page_do_not_grow_with_page_size(app, client, reader, url, setting):
+    counts = _statements_per_page(app, client, url, setting)
+    assert len(set(counts)) == 1, dict(zip(PAGE_SIZES, counts))
@@ -0,0 +1,56 @@
+"""
+JWT 吊销：本进程吊销立即生效，其他进程写入的吊销记录在同步后生效
+"""
+from datetime import datetime
+
+import pytest
+from flask_jwt_extended import decode_token
+
+from app.models import db, RevokedToken
+
+from .conftest import auth_header, get_tokens, make_user
+
+
+@pytest.fixture
+def tokens(app, client):
+    make_user('alice')
+    return get_tokens(client, 'alice')
+
+
+def test_me_reads_identity_from_token(client, tokens):
+    response = client.get('/api/v1.0/users/me', headers=auth_header(tokens['access_token']))
+    assert response.status_code == 200
+    assert response.get_json()['username'] == 'alice'
+
+
+def test_revoked_tokens_are_rejected(client, tokens):
+    response = client.delete('/api/v1.0/tokens', json={'refresh_token': tokens['refresh_token']},
+                             headers=auth_header(tokens['access_token']))
+    assert response.status_code == 204
+
+    response = client.get('/api/v1.0/users/me', headers=auth_header(tokens['access_token']))
+    assert response.status_code == 401
+    response = client.post('/api/v1.0/tokens/refresh', headers=auth_header(tokens['refresh_token']))
+    assert response.status_code == 401
+
+
+def test_revoking_with_another_users_refresh_token_fails(client, tokens):
+    make_user('bob')
+    other = get_tokens(client, 'bob')
+    response = client.delete('/api/v1.0/tokens', json={'refresh_token': other['refresh_token']},
+                             headers=auth_header(tokens['access_token']))
+    assert response.status_code == 400
+    response = client.post('/api/v1.0/tokens/refresh', headers=auth_header(other['refresh_token']))
+    assert response.status_code == 200
+
+
+@pytest.mark.config(JWT_REVOCATION_SYNC_INTERVAL=0)
+def test_revocation_from_another_process_is_synced(client, tokens):
+    headers = auth_header(tokens['access_token'])
+    assert client.get('/api/v1.0/users/me', headers=headers).status_code == 200
+    # 其他进程只写数据库，本进程在下一次同步时读到
+    payload = decode_token(tokens['access_token'])
+    db.session.add(RevokedToken(jti=payload['jti'], token_type='access',
+                                user_id=int(payload['sub']), revoked_at=datetime.utcnow()))
+    db.session.commit()
+    assert client.get('/api/v1.0/users/me', headers=headers).status_code == 401